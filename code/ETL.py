@@ -6,100 +6,391 @@ from datetime import *
 import time as tm
 from collections import Counter
 import locale
+import glob
+import os
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
 from api_functions import *
+from storage_functions import *
 
-def extract_all(articles : list, langs : list, topic : str = "") -> tuple[dict, dict] :
+# raw revisions of each topic, language and article, written page by page as they are fetched
+CHECKPOINT_DIR = "data/raw_data/checkpoints"
 
-    """Extracts, stores and returns raw data for both edits and protection history"""
+# number of extra passes over article-languages that failed
+RETRY_PASSES = 1
 
-    revisions_all= {}
-    failed_runs = []
-    ct = 0
-    tt = len(articles) * len(langs)
+# number of processes of the transform stage, None uses all cores and 1 transforms in the main process
+TRANSFORM_WORKERS = None
 
-    for l in langs:
+# newest stored revision per topic, language and article: {topic: {lang: {article: {'revid': ..., 'timestamp': ...}}}}
+WATERMARKS_PATH = "data/watermarks.json"
 
-        revisions_all[l] = {}
+## Helper functions for incremental runs
 
-        for a in articles:
-            
-            print("Progress {run}/{total}".format(run = ct, total = tt))
+def load_watermarks(path : str = WATERMARKS_PATH) -> dict :
 
-            try:
-                revisions = get_revisions_detailed(a, l)
-                revisions_all[l][a] = revisions
-                tm.sleep(10)
-                
-            except:
-                print("Failed fetching data for {l}/{a}".format(l=l, a=a))
-                failed_runs.append((l,a))
-            
-            ct+=1
+    try:
+        with open(path, encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return {}
+
+def save_watermarks(watermarks : dict, path : str = WATERMARKS_PATH):
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as json_file:
+        json.dump(watermarks, json_file, ensure_ascii=False, indent=1, sort_keys=True)
+
+def load_latest_edits(topic : str, storage : str = "csv") -> pd.DataFrame :
+
+    """Returns the most recent detailed edits table stored for the topic, None if there is none"""
+
+    if storage == "parquet":
+        if not os.path.exists(EDITS_DATASET):
+            return None
+
+        df = load_edits([topic]).drop(columns=['topic'])
+        df[['article', 'language']] = df[['article', 'language']].astype(object)
+
+        return df if len(df) > 0 else None
+
+    files = sorted(glob.glob("data/detailed_data/detailedEdits_{f}_*.csv".format(f = topic)))
+
+    if len(files) == 0:
+        return None
+
+    df = pd.read_csv(files[-1], index_col=0)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # hidden users are stored as empty names, which read_csv turns into NaN
+    df['user'] = df['user'].fillna("")
+
+    return df
+
+def watermarks_from_edits(df : pd.DataFrame) -> dict :
+
+    """Returns watermarks from the newest timestamp of each article-language in a stored table (tables of older runs have no revid)"""
+
+    newest = df.groupby(['language', 'article'])[[c for c in ['timestamp', 'revid'] if c in df.columns]].max()
+
+    watermarks = {}
+    for (l, a), row in newest.iterrows():
+        revid = None if pd.isna(row.get('revid')) else int(row['revid'])
+        watermarks.setdefault(l, {})[a] = {'revid': revid, 'timestamp': row['timestamp'].strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+    return watermarks
+
+def get_watermark(revisions : list) -> dict :
+
+    """Returns the watermark of the newest revision in a non-empty list of raw revisions"""
+
+    newest = max(revisions, key=lambda r: r['revid'])
+
+    return {'revid': newest['revid'], 'timestamp': newest['timestamp']}
+
+def merge_new_revisions(existing_df : pd.DataFrame, new_df : pd.DataFrame) -> pd.DataFrame :
+
+    """Appends new revisions to the stored table, article_edits is recomputed only for the article-languages that changed"""
+
+    if existing_df is None:
+        return new_df
+    if new_df is None:
+        return existing_df
+
+    merged_df = pd.concat([existing_df, new_df], ignore_index=True)
+
+    # revisions stored already are replaced by their new version, rows of tables written before revids were kept have none and stay as they are
+    if 'revid' in existing_df.columns:
+        replaced = merged_df['revid'].notna() & merged_df.duplicated(['language', 'revid'], keep='last')
+        merged_df = merged_df[~replaced].reset_index(drop=True)
+
+    changed = merged_df.set_index(['article', 'language']).index.isin(
+        new_df.set_index(['article', 'language']).index.unique()
+    )
+
+    merged_df.loc[changed, 'article_edits'] = merged_df[changed].groupby(['article', 'language', 'user'])['timestamp'].transform('count')
+    # tables of earlier runs can miss article_edits of some users, those stay NA
+    merged_df['article_edits'] = merged_df['article_edits'].astype('Int32')
+
+    return merged_df
+
+## Helper functions for checkpoints
+
+def checkpoint_path(run : str, lang : str, article : str) -> str :
+
+    return os.path.join(run, lang, quote(article, safe="") + RAW_EXTENSIONS[RAW_COMPRESSION])
+
+def latest_run(topic : str) -> str :
+
+    """Returns the checkpoint directory of the most recent run of the topic, None if there is none"""
+
+    runs = sorted(glob.glob(os.path.join(CHECKPOINT_DIR, glob.escape(topic), "*", "run.json")))
+
+    return os.path.dirname(runs[-1]) if len(runs) > 0 else None
+
+def start_run(topic : str, resume : bool = False) -> tuple[str, bool] :
+
+    """
+    Returns the checkpoint directory of a run and whether an unfinished run is resumed.
+    Every fresh run (or resume = True after a finished run) gets its own timestamped directory, checkpoints of earlier runs are kept like their raw data.
+    """
+
+    # checkpoints are kept per topic, without one a run would resume or mix the runs of other topics
+    if not topic:
+        raise ValueError("ETL() needs a topic")
+
+    run = latest_run(topic)
+
+    if resume and run is not None:
+        with open(os.path.join(run, "run.json")) as f:
+            if not json.load(f)['complete']:
+                return run, True
+
+    run = os.path.join(CHECKPOINT_DIR, topic, datetime.now().strftime("%Y-%m-%d-%H-%M-%S"))
+    os.makedirs(run, exist_ok=True)
+
+    with open(os.path.join(run, "run.json"), "w") as f:
+        json.dump({'started': datetime.now().isoformat(), 'complete': False}, f)
+
+    return run, False
+
+def finish_run(topic : str):
+
+    """Marks the most recent run of a topic as finished, resume = True then starts a fresh run"""
+
+    path = os.path.join(latest_run(topic), "run.json")
+
+    with open(path) as f:
+        manifest = json.load(f)
+
+    manifest['complete'] = True
+
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+
+def open_checkpoint(run : str, lang : str, article : str) -> NDJSONWriter :
+
+    """Returns a writer appending one line per page of revisions, the checkpoint only appears once it is complete"""
+
+    return NDJSONWriter(checkpoint_path(run, lang, article))
+
+def load_checkpoint(path : str) -> list :
+
+    """Returns all raw revisions of a checkpoint"""
+
+    revisions = []
+
+    for page in iter_ndjson(path):
+        revisions.extend(page)
+
+    return revisions
+
+def load_raw_protections(path : str) -> dict :
+
+    """Reads a raw protections file back into the format returned by pull_multiple_protections()"""
+
+    raw_protections = {}
+
+    for record in iter_ndjson(path):
+        raw_protections.setdefault(record['article'], {})[record['language']] = record['result']
+
+    return raw_protections
+
+## Helper functions for the parallel transform
+
+def transform_revisions_partition(partition : tuple) -> tuple :
+
+    """
+    Transforms the checkpoint of one (lang, article, path) partition in a worker process.
+    Returns the transformed revisions (None if there are none) and the newest revision for the watermark.
+    """
+
+    lang, article, path = partition
+
+    edit_list = load_checkpoint(path)
+
+    if len(edit_list) == 0:
+        return None, None
+
+    newest = get_watermark(edit_list)
+
+    append_df = transform_revisions_detailed(article, lang, edit_list)
+    append_df['article_edits'] = append_df.groupby('user')['user'].transform('count')
+
+    return append_df, newest
+
+def transform_protections_partition(partition : tuple) -> pd.DataFrame :
+
+    """Transforms protection logs of one (article, lang, result) partition in a worker process"""
+
+    article, lang, result = partition
+
+    df_log = transform_protections(get_protections_list(result), lang)
+
+    if not isinstance(df_log, pd.DataFrame):
+        return None
+
+    df_log['article'] = article
+    return df_log
+
+def map_partitions(function, partitions : list, workers : int = TRANSFORM_WORKERS) -> list :
+
+    """Applies function to every partition in a process pool, results come back in the order of partitions"""
+
+    if workers == 1 or len(partitions) <= 1:
+        return [function(p) for p in partitions]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, partitions, chunksize=max(1, len(partitions) // (4 * (workers or os.cpu_count())))))
+
+## Extract, transform and load
+
+def extract_all(articles : list, langs : list, topic : str = "", watermarks : dict = None, resume : bool = False) -> tuple[dict, dict] :
+
+    """
+    Extracts, stores and returns raw data for both edit and protection history.
+    Revisions of each article-language are written to a checkpoint as soon as they are fetched,
+    the returned revisions are {lang: {article: checkpoint path}} of the pairs fetched successfully by this run.
+    With resume = True article-languages which already have a checkpoint of the unfinished run of this topic are not fetched again.
+    With watermarks only revisions newer than the watermark of each article-language are extracted.
+    """
+
+    pairs = [(l, a) for l in langs for a in articles]
+
+    # a resumed run skips the pairs it already wrote, checkpoints of other runs are never read
+    done = []
+    run, resumed = start_run(topic, resume)
+    if resumed:
+        done = [(l, a) for l, a in pairs if os.path.exists(checkpoint_path(run, l, a))]
+        pairs = [p for p in pairs if p not in done]
+
+    print("Extracting {n}/{total} article-language pairs".format(n = len(pairs), total = len(articles) * len(langs)))
+
+    def open_writer(l, a):
+        return open_checkpoint(run, l, a)
+
+    _, failed_runs = get_multiple_revisions(articles, langs, watermarks, open_writer, pairs)
+
+    for i in range(RETRY_PASSES):
+        if len(failed_runs) == 0:
+            break
+        print("Retrying {n} failed pairs".format(n = len(failed_runs)))
+        _, failed_runs = get_multiple_revisions(articles, langs, watermarks, open_writer, failed_runs)
     
     print("Failed runs: ")
     print(failed_runs)
-    
-    with open("data/raw_data/edits/raw_edits_{f}_{d}.json".format(
-        f = topic, d = datetime.now().strftime("%Y-%m-%d-%H-%M")), "w") as json_file:
-        json.dump(revisions_all, json_file, indent=4)
+
+    revisions_all = {l: {} for l in langs}
+    for l, a in done + [p for p in pairs if p not in failed_runs]:
+        revisions_all[l][a] = checkpoint_path(run, l, a)
 
     raw_protections = pull_multiple_protections(articles, langs)
     
-    with open("data/raw_data/raw_protections_{f}_{d}.json".format(
-        f = topic, d = datetime.now().strftime("%Y-%m-%d-%H-%M")), "w") as json_file:
-        
-        json.dump(raw_protections, json_file, indent=4)
+    write_ndjson("data/raw_data/raw_protections_{f}_{d}{e}".format(
+        f = topic, d = datetime.now().strftime("%Y-%m-%d-%H-%M"), e = RAW_EXTENSIONS[RAW_COMPRESSION]),
+        ({'article': a, 'language': l, 'result': result} for a, d in raw_protections.items() for l, result in d.items())
+    )
     
     return revisions_all, raw_protections
 
-def ETL(articles : list, langs : list, topic : str = ""):
+def ETL(articles : list, langs : list, topic : str = "", incremental : bool = False, resume : bool = False, storage : str = "csv"):
+
+    """
+    Extracts raw data, then applies transformations, then stores for both edit and protection history.
+    With incremental = True only revisions newer than the last stored ones are extracted and merged into the latest detailed edits table of the topic.
+    With resume = True a crashed run continues from the checkpoints it already wrote, a fresh run writes its checkpoints into a new directory.
+    storage = "parquet" stores the tables in datasets partitioned by topic/language/article instead of csv files,
+    storage = "sqlite" upserts them into the warehouse keyed by revision id (incremental runs then return only the new edits).
+    """
+
+    # the statistics printed at the end cover this run only
+    reset_request_stats()
+
+    all_watermarks = load_watermarks()
+    existing_df = None
+    watermarks = None
+
+    if incremental and storage == "sqlite":
+        # the warehouse recounts article_edits itself, stored edits are not loaded
+        watermarks = load_warehouse_watermarks(topic)
 
-    """Extracts raw data, then applies transformations, then stores for both edit and protection history."""
+    elif incremental:
+        existing_df = load_latest_edits(topic, storage)
+
+        if existing_df is not None:
+            watermarks = watermarks_from_edits(existing_df)
 
     ## EXTRACT
-    raw_revisions, raw_protections = extract_all(articles, langs, topic)
+    raw_revisions, raw_protections = extract_all(articles, langs, topic, watermarks, resume)
 
     print("Extraction complete")
+
+    # the stored edits decide which article-languages have a watermark, a full run starts without any
+    # so that pairs missing from its table (i.e. failed ones) are fetched whole by the next incremental run
+    new_watermarks = {l: dict(lang_dict) for l, lang_dict in (watermarks or {}).items()}
+    revisions_dfs = []
     
     ## TRANSFORM
-    for lang, lang_dict in raw_revisions.items():
+    partitions = [(l, a, path) for l, lang_dict in raw_revisions.items() for a, path in lang_dict.items()]
+    transformed = map_partitions(transform_revisions_partition, partitions)
 
-        for article, edit_list in lang_dict.items():
+    lang_dfs = {l: [] for l in raw_revisions.keys()}
 
-            append_df = transform_revisions_detailed(article, lang, edit_list)
-            append_df['article_edits'] = append_df.groupby('user')['user'].transform('count')
-            
-            try: 
-                revisions_df_l = pd.concat([revisions_df_l, append_df])
-            except:
-                revisions_df_l = append_df
+    for (lang, article, _), (append_df, newest) in zip(partitions, transformed):
 
-        tm.sleep(1200)
-        
-        revisions_df_l = join_users_edits(lang = lang, revisions = revisions_df_l)
+        # article-languages without new revisions need no transformation
+        if append_df is None:
+            continue
 
-        try: 
-            revisions_df = pd.concat([revisions_df, revisions_df_l])
-        except:
-            revisions_df = revisions_df_l
-        
-        del revisions_df_l
+        new_watermarks.setdefault(lang, {})[article] = newest
+        lang_dfs[lang].append(append_df)
+
+    for lang, dfs in lang_dfs.items():
+
+        if len(dfs) > 0:
+            revisions_dfs.append(join_users_edits(lang = lang, revisions = pd.concat(dfs)))
+
+    # partial tables are collected and concatenated once, growing a table inside the loop copies it every time
+    revisions_df = pd.concat(revisions_dfs) if len(revisions_dfs) > 0 else None
     
-    protections_df = transform_multiple_protections(raw_protections)
+    if incremental and storage != "sqlite":
+        revisions_df = merge_new_revisions(existing_df, revisions_df)
+
+    partitions = [(a, l, result) for a, d in raw_protections.items() for l, result in d.items()]
+    protections_dfs = [df for df in map_partitions(transform_protections_partition, partitions) if df is not None]
+    protections_df = pd.concat(protections_dfs, ignore_index=True) if len(protections_dfs) > 0 else pd.DataFrame()
 
     print("Transformation complete")
     
     ## LOAD
-    revisions_df.to_csv("data/detailed_data/detailedEdits_{f}_{t}.csv".format(
-        f = topic, 
-        t = datetime.now().strftime("%Y-%m-%d-%H-%M")))
-    
-    protections_df.to_csv('data/protection_data/protections_{f}_{d}.csv'.format(
-        f = topic, 
-        d = datetime.now().strftime("%Y-%m-%d-%H-%M"))
-    )
+    if storage == "parquet":
+        if revisions_df is not None:
+            write_edits(revisions_df, topic)
+        write_protections(protections_df, topic)
+
+    elif storage == "sqlite":
+        if revisions_df is not None:
+            upsert_edits(revisions_df, topic)
+        upsert_protections(protections_df, topic)
+
+    else:
+        if revisions_df is not None:
+            revisions_df.to_csv("data/detailed_data/detailedEdits_{f}_{t}.csv".format(
+                f = topic, 
+                t = datetime.now().strftime("%Y-%m-%d-%H-%M")))
+        
+        protections_df.to_csv('data/protection_data/protections_{f}_{d}.csv'.format(
+            f = topic, 
+            d = datetime.now().strftime("%Y-%m-%d-%H-%M"))
+        )
+
+    # watermarks move only once the revisions they cover are stored
+    all_watermarks[topic] = new_watermarks
+    save_watermarks(all_watermarks)
+    finish_run(topic)
 
     print("Data stored")
+    print_request_stats()
 
     return revisions_df, protections_df
 
@@ -0,0 +1,420 @@
+## Here metrics of all article-languages are computed at once, instead of filtering the edits table once per article-language
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from scipy import special
+
+# columns identifying one series of edits
+SERIES_KEYS = ['article', 'language']
+
+# monthly_grid(): series keys, counts summed into totals and default time windows of the totals
+GRID_KEYS = ['topic', 'article', 'language']
+GRID_TOTALS = {'total_edits': 'edits', 'total_reversions': 'reversions', 'total_reverted': 'reverted_edits'}
+GRID_WINDOWS = {'_after_aug2020': datetime(2020, 9, 1)}
+
+# end of protections without an expiry
+PROTECTION_INFINITY = datetime(2029, 12, 31)
+
+# user names of anonymous editors are their IPv4 address
+ANON_USER_PATTERN = r'^(\d{1,3}\.){3}\d{1,3}$'
+
+## Helper functions
+
+def group_series(df : pd.DataFrame, keys : list = SERIES_KEYS) -> tuple[pd.DataFrame, np.ndarray]:
+
+    """Returns the distinct keys (sorted) and the position of each edit's series among them, -1 for edits with missing keys"""
+
+    groups = df.groupby(keys, observed=True, sort=True)
+
+    return groups.size().reset_index(name='edits'), groups.ngroup().to_numpy()
+
+def sort_series(codes : np.ndarray, df : pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+
+    """Returns series codes and timestamps (seconds since 1970) sorted by series and time with a single sort"""
+
+    timestamps = df['timestamp'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+    order = np.lexsort((timestamps, codes))
+    order = order[codes[order] >= 0]
+
+    return codes[order], timestamps[order]
+
+def to_seconds(time : datetime) -> int:
+
+    return np.datetime64(pd.Timestamp(time), 's').astype(np.int64)
+
+def to_month(time : datetime) -> int:
+
+    """Returns the number of months since year 0, i.e. 2020 * 12 + 8 for September 2020"""
+
+    return time.year * 12 + time.month - 1
+
+## Burstiness and edit frequency
+
+def interval_stats(df : pd.DataFrame, keys : list = SERIES_KEYS, windows : dict = None) -> pd.DataFrame:
+
+    """
+    Returns first_edit, edits, edit_frequency (mean hours between consecutive edits) and
+    burstiness ((std - mean) / (std + mean) of the hours between edits) of every series in one pass.
+    windows adds the same metrics for edits within a time window, keyed by a column suffix, i.e.
+    {'_2010': datetime(2010,1,1)} adds edit_frequency_2010 and burstiness_2010, a window can also be a (start, stop) tuple.
+    """
+
+    stats, codes = group_series(df, keys)
+    stats.insert(len(keys), 'first_edit', df.groupby(keys, observed=True, sort=True)['timestamp'].min().to_numpy())
+
+    codes, timestamps = sort_series(codes, df)
+
+    for suffix, window in {"": None, **(windows or {})}.items():
+
+        start, stop = window if isinstance(window, tuple) else (window, None)
+
+        keep = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            keep &= timestamps >= to_seconds(start)
+        if stop is not None:
+            keep &= timestamps <= to_seconds(stop)
+
+        c, t = codes[keep], timestamps[keep]
+
+        # consecutive edits of the same series
+        same = c[1:] == c[:-1]
+        hours = pd.Series(np.diff(t)[same] / 3600)
+
+        agg = hours.groupby(c[1:][same]).agg(['mean', 'std']).reindex(range(len(stats)))
+
+        stats['edit_frequency' + suffix] = agg['mean'].to_numpy()
+        stats['burstiness' + suffix] = ((agg['std'] - agg['mean']) / (agg['std'] + agg['mean'])).to_numpy()
+
+    return stats
+
+## Pairwise correlations
+
+def series_matrix(df : pd.DataFrame, value : str = 'edits', keys : list = SERIES_KEYS, time : str = 'date') -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+
+    """
+    Pivots a long table of counts into a dense series x period matrix, rows of the same series and period are summed.
+    Returns the keys of the rows, the sorted periods of the columns and the matrix, NaN where a series has no row for a period.
+    """
+
+    series, codes = group_series(df, keys)
+    periods, columns = np.unique(df[time].to_numpy(), return_inverse=True)
+
+    keep = codes >= 0
+    cells = codes[keep].astype(np.int64) * len(periods) + columns[keep]
+    size = len(series) * len(periods)
+
+    values = np.bincount(cells, weights=df[value].to_numpy(dtype=float)[keep], minlength=size)
+    present = np.bincount(cells, minlength=size) > 0
+    values[~present] = np.nan
+
+    return series, periods, values.reshape(len(series), len(periods))
+
+def pearson_pvalues(r : np.ndarray, n : np.ndarray) -> np.ndarray:
+
+    """Two-sided p-values of Pearson correlations r computed from n observations, same as scipy.stats.pearsonr()"""
+
+    # the t statistic r * sqrt((n - 2) / (1 - r^2)) expressed through the regularized incomplete beta function
+    with np.errstate(invalid='ignore'):
+        p = special.betainc((n - 2) / 2, 0.5, np.clip(1 - r ** 2, 0, 1))
+
+    return np.where(n == 2, 1.0, p)
+
+def pairwise_correlations(df : pd.DataFrame, value : str = 'edits', keys : list = SERIES_KEYS, time : str = 'date', min_overlap : int = 2, block_size : int = 256) -> pd.DataFrame:
+
+    """
+    Returns Pearson correlation and p-value of every pair of series over the periods both of them have rows for,
+    in the format of calculate_correlations(): Article1, Article2, Lang1, Lang2, Correlation, P_value.
+    The series x period matrix is built once, pairs are computed block_size rows at a time so that memory stays
+    bounded by block_size x number of series. Pairs with less than min_overlap common periods are left out,
+    pairs where one of the series is constant over the common periods get a NaN correlation.
+    """
+
+    series, _, matrix = series_matrix(df, value, keys, time)
+
+    present = ~np.isnan(matrix)
+    mask = present.astype(float)
+
+    # correlations do not change when a series is shifted, centering keeps the sums below small
+    centered = np.where(present, matrix - np.nanmean(matrix, axis=1, keepdims=True), 0.0)
+    squared = centered ** 2
+
+    firsts, seconds, correlations, counts = [], [], [], []
+
+    for start in range(0, len(series), block_size):
+
+        rows = slice(start, start + block_size)
+        cols = slice(start, None)
+
+        n = mask[rows] @ mask[cols].T
+        sum_x = centered[rows] @ mask[cols].T
+        sum_y = mask[rows] @ centered[cols].T
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var_x = squared[rows] @ mask[cols].T - sum_x ** 2 / n
+            var_y = mask[rows] @ squared[cols].T - sum_y ** 2 / n
+            cov = centered[rows] @ centered[cols].T - sum_x * sum_y / n
+
+            # rounding leaves tiny variances where a series is constant over the common periods
+            var_x[var_x <= 1e-12 * (squared[rows] @ mask[cols].T)] = 0
+            var_y[var_y <= 1e-12 * (mask[rows] @ squared[cols].T)] = 0
+
+            r = np.clip(cov / np.sqrt(var_x * var_y), -1, 1)
+
+        # each pair once, first series before second
+        i, j = np.nonzero((np.arange(n.shape[0])[:, None] < np.arange(n.shape[1])[None, :]) & (n >= min_overlap))
+
+        firsts.append((i + start).astype(np.int32))
+        seconds.append((j + start).astype(np.int32))
+        correlations.append(r[i, j])
+        counts.append(n[i, j].astype(np.int32))
+
+    first, second = np.concatenate(firsts), np.concatenate(seconds)
+    correlation, count = np.concatenate(correlations), np.concatenate(counts)
+
+    # categorical keys keep millions of pairs small
+    articles, langs = series[keys[0]].astype('category').array, series[keys[1]].astype('category').array
+
+    return pd.DataFrame({
+        'Article1': articles.take(first),
+        'Article2': articles.take(second),
+        'Lang1': langs.take(first),
+        'Lang2': langs.take(second),
+        'Correlation': correlation,
+        'P_value': np.where(np.isnan(correlation), np.nan, pearson_pvalues(correlation, count)),
+    })
+
+## Monthly grid
+
+def monthly_grid(df : pd.DataFrame, keys : list = GRID_KEYS, oldest : datetime = datetime(2005,1,1), end : datetime = None, windows : dict = GRID_WINDOWS) -> pd.DataFrame:
+
+    """
+    Inserts months with no edit activity into a table of monthly counts with one row per series, year and month.
+    Every series gets all months from its first month (or oldest, whichever is later) until end, by default December
+    of the last year in df. Counts of inserted months are 0, other columns (i.e. mean_size) are NaN.
+    Totals of GRID_TOTALS over each series are added as well, and once more for every time window keyed by
+    a column suffix, i.e. {'_after_aug2020': datetime(2020,9,1)} adds total_edits_after_aug2020, ...
+    a window can also be a (start, stop) tuple.
+    The grid is laid out from each series' own month range, memory stays proportional to the output.
+    """
+
+    series, codes = group_series(df, keys)
+    months = df['year'].to_numpy(dtype=np.int64) * 12 + df['month'].to_numpy(dtype=np.int64) - 1
+
+    valid = codes >= 0
+    first = np.full(len(series), months.max() + 1)
+    np.minimum.at(first, codes[valid], months[valid])
+
+    start = np.maximum(first, to_month(oldest))
+    stop = to_month(end) if end is not None else months.max() // 12 * 12 + 11
+
+    # row range of each series in the grid
+    lengths = np.clip(stop - start + 1, 0, None)
+    offsets = np.cumsum(lengths) - lengths
+    rows = np.repeat(np.arange(len(series)), lengths)
+    grid_months = start[rows] + np.arange(len(rows)) - offsets[rows]
+
+    # grid position of each row of df
+    inside = valid & (months >= start[codes]) & (months <= stop)
+    positions = offsets[codes[inside]] + months[inside] - start[codes[inside]]
+
+    grid = series[keys].take(rows).reset_index(drop=True)
+    grid['date'] = (grid_months - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]')
+
+    values = [column for column in df.columns if column not in keys + ['year', 'month', 'first_edit']]
+
+    for column in values:
+        counts = column in GRID_TOTALS.values()
+        filled = np.zeros(len(rows), dtype=df[column].dtype) if counts else np.full(len(rows), np.nan)
+        filled[positions] = df[column].to_numpy()[inside]
+        grid[column] = filled
+
+    if 'first_edit' in df.columns:
+        grid['first_edit'] = df.groupby(codes)['first_edit'].first().reindex(range(len(series))).to_numpy()[rows]
+
+    for suffix, window in {"": None, **windows}.items():
+
+        window_start, window_stop = window if isinstance(window, tuple) else (window, None)
+
+        keep = np.ones(len(rows), dtype=bool)
+        if window_start is not None:
+            keep &= grid_months >= to_month(window_start)
+        if window_stop is not None:
+            keep &= grid_months <= to_month(window_stop)
+
+        months_in_window = np.bincount(rows[keep], minlength=len(series))
+
+        for total, column in GRID_TOTALS.items():
+            sums = np.bincount(rows[keep], weights=grid[column].to_numpy()[keep], minlength=len(series))
+            grid[total + suffix] = np.where(months_in_window > 0, sums, np.nan)[rows] if suffix else sums[rows]
+
+    return grid.sort_values('date', kind='stable', ignore_index=True)
+
+## Protection coverage
+
+def protection_intervals(protections : pd.DataFrame, keys : list = SERIES_KEYS, infinite : datetime = PROTECTION_INFINITY) -> pd.DataFrame:
+
+    """
+    Returns all protections but unprotect actions sorted by series and time, with their effective end:
+    expiry_mod is the expiry (infinite when missing) cut at the first later unprotect of the series,
+    expiry_mod_mod is expiry_mod cut at the next protection of the series.
+    Both are found with one as-of merge per kind of event instead of filtering the table once per protection.
+    """
+
+    protections = protections.assign(timestamp = pd.to_datetime(protections['timestamp']))
+    unprotect = protections['action'] == 'unprotect'
+
+    intervals = protections[~unprotect].sort_values('timestamp', kind='stable')
+    intervals['expiry_mod'] = pd.to_datetime(intervals['expiry']).fillna(infinite)
+
+    for column, events in [('expiry_mod', protections[unprotect]), ('expiry_mod_mod', intervals)]:
+
+        following = events[keys + ['timestamp']].sort_values('timestamp', kind='stable')
+
+        # first event of the same series strictly after each protection
+        intervals = pd.merge_asof(intervals, following.assign(next_event=following['timestamp']), on='timestamp', by=keys, direction='forward', allow_exact_matches=False)
+
+        intervals[column] = intervals['expiry_mod'].mask(intervals['next_event'] < intervals['expiry_mod'], intervals['next_event'])
+        intervals = intervals.drop(columns='next_event')
+
+    return intervals.sort_values(keys + ['timestamp'], kind='stable', ignore_index=True)
+
+def monthly_protection(intervals : pd.DataFrame, grid : pd.DataFrame, keys : list = SERIES_KEYS, start : str = 'timestamp', end : str = 'expiry_mod_mod') -> pd.DataFrame:
+
+    """
+    Adds protected_time (days) and protected_proportion (share of the month) to every month of grid, a table with
+    keys and a month start date column. Each protection interval is clipped to the months it overlaps with array
+    arithmetic, overlapping intervals of a series add up.
+    """
+
+    months = grid['date'].to_numpy(dtype='datetime64[M]').astype(np.int64)
+    starts = intervals[start].to_numpy(dtype='datetime64[s]')
+    ends = intervals[end].to_numpy(dtype='datetime64[s]')
+
+    # months an interval can overlap with, the month before its start counts when it starts on the first of a month
+    first = np.maximum(starts.astype('datetime64[M]').astype(np.int64) - 1, months.min())
+    last = np.minimum(ends.astype('datetime64[M]').astype(np.int64), months.max())
+
+    lengths = np.clip(last - first + 1, 0, None)
+    rows = np.repeat(np.arange(len(intervals)), lengths)
+    month = first[rows] + np.arange(len(rows)) - (np.cumsum(lengths) - lengths)[rows]
+
+    month_start = month.astype('datetime64[M]').astype('datetime64[s]')
+    month_end = (month + 1).astype('datetime64[M]').astype('datetime64[s]')
+
+    overlaps = (starts[rows] <= month_end) & (ends[rows] >= month_start)
+    rows, month_start, month_end = rows[overlaps], month_start[overlaps], month_end[overlaps]
+
+    seconds = (np.minimum(ends[rows], month_end) - np.maximum(starts[rows], month_start)).astype(np.int64)
+
+    protected = intervals[keys].take(rows).reset_index(drop=True).assign(date=month_start.astype('datetime64[ns]'), protected_time=seconds / (3600 * 24))
+    protected = protected.groupby(keys + ['date'], observed=True)['protected_time'].sum().reset_index()
+
+    month_length = ((months + 1).astype('datetime64[M]').astype('datetime64[D]') - months.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+
+    grid = grid.merge(protected, on=keys + ['date'], how='left')
+    grid['protected_time'] = grid['protected_time'].fillna(0)
+    grid['protected_proportion'] = grid['protected_time'] / month_length
+
+    return grid
+
+## Edit deltas and jerk
+
+def anon_users(users : pd.Series) -> np.ndarray:
+
+    """Flags users whose name is an IP address, the pattern is matched once per distinct user"""
+
+    users = users.astype('category')
+    anon = users.cat.categories.to_series().astype(str).str.match(ANON_USER_PATTERN).to_numpy()
+
+    # missing users are not flagged
+    return np.append(anon, False)[users.cat.codes.to_numpy()]
+
+def edit_deltas(df : pd.DataFrame, keys : list = SERIES_KEYS) -> pd.DataFrame:
+
+    """
+    Returns the edits of all series sorted by series and time (revid breaks ties) with
+    edit_delta (size change to the previous edit of the series), sign_delta (sign of edit_delta / 2),
+    sign_change (1 when the sign flipped, 0.5 from or to a zero delta), month_year, is_anon_uname and
+    frac_edits_on_this_article. The first edit of each series has no delta and is left out.
+    """
+
+    _, codes = group_series(df, keys)
+    timestamps = df['timestamp'].to_numpy(dtype='datetime64[s]')
+    order = np.lexsort((df['revid'].to_numpy(), timestamps, codes) if 'revid' in df.columns else (timestamps, codes))
+    order = order[codes[order] >= 0]
+
+    codes = codes[order]
+    size = df['size'].to_numpy(dtype=float)[order]
+
+    # rows with a previous edit of the same series
+    follows = np.append(False, codes[1:] == codes[:-1])
+
+    deltas = df.iloc[order[follows]].reset_index(drop=True)
+    deltas['edit_delta'] = np.diff(size)[follows[1:]]
+    deltas['sign_delta'] = np.sign(deltas['edit_delta'].to_numpy()) / 2
+
+    # the first delta of each series has nothing to change sign from
+    codes = codes[follows]
+    sign_change = np.abs(np.diff(deltas['sign_delta'].to_numpy(), prepend=0))
+    sign_change[np.append(True, codes[1:] != codes[:-1])] = 0
+
+    deltas['sign_change'] = sign_change
+    deltas['month_year'] = deltas['timestamp'].dt.to_period('M')
+    deltas['is_anon_uname'] = anon_users(deltas['user'])
+    deltas['frac_edits_on_this_article'] = deltas['article_edits'] / deltas['total_edits']
+
+    return deltas
+
+def monthly_jerk(deltas : pd.DataFrame, keys : list = SERIES_KEYS) -> pd.DataFrame:
+
+    """
+    Returns num_edits, num_sign_changes, relative_sign_changes (jerk), rel_changes_squared and anon_fraction
+    of every month with edits of every series, from the output of edit_deltas().
+    """
+
+    stats = deltas.groupby(keys + ['month_year'], observed=True).agg(
+        num_edits = ('edit_delta', 'size'),
+        num_sign_changes = ('sign_change', 'sum'),
+        anon_edits = ('is_anon_uname', 'sum')
+    ).reset_index()
+
+    stats['month_year'] = stats['month_year'].dt.to_timestamp()
+    stats['relative_sign_changes'] = stats['num_sign_changes'] / stats['num_edits']
+    stats['rel_changes_squared'] = stats['relative_sign_changes'] ** 2
+    stats['anon_fraction'] = stats['anon_edits'] / stats['num_edits']
+
+    return stats.drop(columns='anon_edits')
+
+def jerk_stats(deltas : pd.DataFrame, keys : list = SERIES_KEYS, windows : dict = None) -> pd.DataFrame:
+
+    """
+    Returns earliest_edit, num_edits, overall_jerk (sign changes per edit) and anon_fraction of every series
+    from the output of edit_deltas(). windows adds overall_jerk of edits strictly within a time window, keyed by
+    a column suffix, i.e. {'_2020': datetime(2020,1,1)}, a window can also be a (start, stop) tuple.
+    """
+
+    stats = deltas.groupby(keys, observed=True).agg(
+        earliest_edit = ('timestamp', 'min'),
+        num_edits = ('edit_delta', 'size'),
+        sign_changes = ('sign_change', 'sum'),
+        anon_edits = ('is_anon_uname', 'sum')
+    )
+
+    stats['overall_jerk'] = stats['sign_changes'] / stats['num_edits']
+    stats['anon_fraction'] = stats['anon_edits'] / stats['num_edits']
+
+    for suffix, window in (windows or {}).items():
+
+        start, stop = window if isinstance(window, tuple) else (window, None)
+
+        keep = np.ones(len(deltas), dtype=bool)
+        if start is not None:
+            keep &= (deltas['timestamp'] > start).to_numpy()
+        if stop is not None:
+            keep &= (deltas['timestamp'] < stop).to_numpy()
+
+        jerk = deltas[keep].groupby(keys, observed=True)['sign_change'].agg(['sum', 'size'])
+        stats['overall_jerk' + suffix] = (jerk['sum'] / jerk['size']).reindex(stats.index)
+
+    return stats.drop(columns=['sign_changes', 'anon_edits']).reset_index()
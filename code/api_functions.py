@@ -3,12 +3,132 @@ import re
 import requests as req
 import json
 import pandas as pd
+import numpy as np
+import itertools
 from datetime import *
 import time as tm
 from collections import Counter
-import locale
+from functools import lru_cache
+import asyncio
+import ipaddress
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Iterator, AsyncIterator
+from urllib.parse import quote
+from http_functions import *
 
-## Universal helper function
+## Universal helper functions
+
+# persistent map of article names in other language versions, {lang: {english_article: title or None}}
+TITLE_MAP_PATH = "data/title_map.json"
+
+# maximum number of titles accepted by the titles parameter
+TITLES_BATCH_SIZE = 50
+
+title_map = None
+title_map_lock = threading.Lock()
+
+class TitleNotFoundError(LookupError):
+    pass
+
+def load_title_map(path : str = TITLE_MAP_PATH) -> dict:
+
+    """Returns the title map, reading it from disk on first use"""
+
+    global title_map
+
+    if title_map is None:
+        try:
+            with open(path, encoding="utf-8") as json_file:
+                title_map = json.load(json_file)
+        except FileNotFoundError:
+            title_map = {}
+
+    return title_map
+
+def save_title_map(path : str = TITLE_MAP_PATH):
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w", encoding="utf-8") as json_file:
+        json.dump(title_map, json_file, ensure_ascii=False, indent=1, sort_keys=True)
+
+def get_langlinks_batch(articles : list) -> dict:
+
+    """
+    Returns {article: {lang: title}} for up to TITLES_BATCH_SIZE English articles with a single query (plus continuations).
+    Redirects are followed, articles without an English page map to None.
+    """
+
+    params = {
+        "action": "query",
+        "prop": "langlinks",
+        "titles": "|".join(articles),
+        "redirects": 1,
+        "lllimit": "max",
+        "format": "json",
+        "formatversion": 2,
+    }
+
+    pages = {}
+    aliases = {}
+
+    while True:
+        response = api_get(api_url("en"), params)
+        query = response['query']
+
+        for d in query.get('normalized', []) + query.get('redirects', []):
+            aliases[d['from']] = d['to']
+
+        for page in query['pages']:
+            links = pages.setdefault(page['title'], None if 'missing' in page or 'invalid' in page else {})
+            for l in page.get('langlinks', []):
+                links[l['lang']] = l['title']
+
+        if 'continue' not in response:
+            break
+        params = dict(params, **response['continue'])
+
+    output = {}
+    for a in articles:
+        title = a
+        # normalization first ("Kolach_(bread)" -> "Kolach (bread)"), then a redirect
+        while title in aliases:
+            title = aliases[title]
+        output[a] = pages.get(title)
+
+    return output
+
+def resolve_titles(articles : list, langs : list, refresh : bool = False) -> dict:
+
+    """
+    Returns {lang: {article: title}} for English articles, title is None where the language version does not exist.
+    Only articles missing in the persistent title map are requested, TITLES_BATCH_SIZE at a time.
+    """
+
+    with title_map_lock:
+        load_title_map()
+
+        missing = [a for a in dict.fromkeys(articles) if refresh or any(a not in title_map.get(l, {}) for l in langs)]
+
+        for i in range(0, len(missing), TITLES_BATCH_SIZE):
+            for a, links in get_langlinks_batch(missing[i:i + TITLES_BATCH_SIZE]).items():
+
+                if links is None:
+                    print("Article {a} does not exist on en wikipedia".format(a=a))
+                    links = {}
+
+                for l, title in links.items():
+                    title_map.setdefault(l, {})[a] = title
+                for l in langs:
+                    title_map.setdefault(l, {}).setdefault(a, None)
+
+        if missing:
+            save_title_map()
+
+        return {l: {a: title_map[l][a] for a in articles} for l in langs}
 
 def get_article_name(
     articleTitle: str, LangOne: str = "en", LangTwo: str = "de"
@@ -17,64 +137,247 @@ def get_article_name(
     """
     Returns article's name in LangTwo -
     i.e. get_article_name("Vienna", "en", "de") returns "Wien"
+    Raises TitleNotFoundError when the article has no LangTwo version.
     """
 
-    articleTitle = articleTitle.replace(" ", "_")
+    if LangOne == "en":
+        title = resolve_titles([articleTitle], [LangTwo])[LangTwo][articleTitle]
 
-    query_langs = "https://api.wikimedia.org/core/v1/wikipedia/{lang}/page/{title}/links/language".format(
-        lang=LangOne, title=articleTitle
-    )
+    else:
+        query_langs = "{rest}/page/{title}/links/language".format(
+            rest=rest_url(LangOne), title=quote(articleTitle.replace(" ", "_"), safe="")
+        )
+        response = api_get(query_langs)
+        title = next((d["title"] for d in response if d["code"] == LangTwo), None)
+
+    if title is None:
+        raise TitleNotFoundError("{a} has no {l} version".format(a=articleTitle, l=LangTwo))
+
+    return title
+
+## Pagination
+
+def iter_query(lang : str, params : dict) -> Iterator[dict] :
+
+    """
+    Yields responses of an action API query one page at a time.
+    Follows whatever continue token the query returns (rvcontinue, uccontinue, lecontinue, ...), only one page is held in memory.
+    """
+
+    params = dict(params)
+
+    while True:
+        response = api_get(api_url(lang), params)
+        yield response
+
+        if 'continue' not in response:
+            return
+        params.update(response['continue'])
+
+async def iter_query_async(lang : str, params : dict) -> AsyncIterator[dict] :
+
+    """Awaitable version of iter_query()"""
+
+    params = dict(params)
 
-    response = req.get(query_langs).json()
+    while True:
+        response = await api_get_async(api_url(lang), params)
+        yield response
 
-    return [d for d in response if d["code"] == LangTwo][0]["title"]
+        if 'continue' not in response:
+            return
+        params.update(response['continue'])
 
 ## Functions to pull and transform revisions
 
+def revisions_params(articleTitle : str, prev : str = None, user : str = None, end : str = None) -> dict :
+
+    """Returns query parameters for one page of up to 500 revisions of an article, optionally stopping at timestamp end"""
+
+    params = {
+        "action": "query",
+        "prop": "revisions",
+        "rvlimit": 500,
+        "titles": articleTitle,
+        "format": "json",
+        "rvprop": "ids|timestamp|flags|comment|user|tags|size",
+    }
+
+    if prev is not None:
+        params["rvcontinue"] = prev
+
+    if user is not None:
+        params["rvuser"] = user
+
+    if end is not None:
+        # revisions are listed newest first (rvdir=older), so rvend is the oldest timestamp returned
+        params["rvend"] = end
+
+    return params
+
+def get_page_revisions(response : dict) -> list :
+
+    """Returns the revisions contained in one API response"""
+
+    page = next(iter(response["query"]["pages"].values()))
+
+    if 'missing' in page:
+        raise TitleNotFoundError("{t} does not exist".format(t=page['title']))
+
+    # an existing page has no revisions key when nothing is newer than rvend
+    return page.get('revisions', [])
+
+def filter_new_revisions(revisions : list, since : dict = None) -> list :
+
+    """Drops revisions at or before the watermark {'revid': ..., 'timestamp': ...}, revid is None for watermarks taken from stored tables"""
+
+    if since is None:
+        return revisions
+
+    if since.get('revid') is not None:
+        return [r for r in revisions if r['revid'] > since['revid']]
+
+    return [r for r in revisions if r['timestamp'] > since['timestamp']]
+
+def get_revisions_title(article : str, lang : str) -> str :
+
+    """Returns the title under which the article's revisions are requested in inputted language version"""
+
+    if lang != "en":
+        return get_article_name(article, "en", lang)
+
+    return article
+
+def iter_revisions_detailed(
+    article : str,
+    lang : str = "en",
+    prev : str = None,
+    user : str = None,
+    since : dict = None) -> Iterator[list] :
+
+    """
+    Yields revisions of an article one page (up to 500 revisions) at a time, newest first.
+    With a watermark since, only revisions newer than it are requested.
+    """
+
+    end = since['timestamp'] if since is not None else None
+    params = revisions_params(get_revisions_title(article, lang), prev, user, end)
+
+    for response in iter_query(lang, params):
+        yield filter_new_revisions(get_page_revisions(response), since)
+
 def get_revisions_detailed(
     article : str,
     lang: str = "en",
     prev : str  = None,
-    user : str = None) -> list : 
+    user : str = None,
+    since : dict = None) -> list : 
     
     """
-    Based on inputted article and language creates a request, calls get_revisions_query() and returns list of timestamps when revisions on an article where made
+    Based on inputted article and language calls iter_revisions_detailed() and returns list of all revisions made on an article
+    (or only those newer than watermark since)
     """
 
-    if lang != "en":
-        articleTitle = get_article_name(article, "en", lang)
-    else:
-        articleTitle = article
+    revisions = []
 
-    rvcontinue = ""
-    rvuser = ""
+    for page in iter_revisions_detailed(article, lang, prev, user, since):
+        revisions.extend(page)
 
-    if prev is not None:
-        rvcontinue += "rvcontinue={prev}&".format(prev=prev)
+    return revisions
 
-    if user is not None:
-        rvuser += "rvuser={user}&".format(user=user)
+async def get_revisions_detailed_async(article : str, lang : str = "en", user : str = None, since : dict = None, on_page = None) -> list :
 
-    query = "https://{lang}.wikipedia.org/w/api.php?action=query&prop=revisions&rvlimit=500&titles={articleTitle}&{rvcontinue}{rvuser}format=json&rvprop=ids|timestamp|flags|comment|user|tags|size".format(
-        lang=lang, articleTitle=articleTitle, rvcontinue = rvcontinue, rvuser=rvuser
-    )
+    """
+    Awaitable version of get_revisions_detailed(), returns the same list of revision dicts.
+    Pages of one article are requested one after another, different articles and languages run concurrently.
+    If on_page(revisions) is given, every page is handed to it as it arrives and nothing is kept in memory.
+    """
 
-    response = req.get(query).json()
+    async with get_host_semaphore(api_url("en")):
+        articleTitle = await asyncio.to_thread(get_revisions_title, article, lang)
 
-    revisions = response["query"]["pages"]
-    revisions = next(iter(revisions.values()))['revisions']
+    end = since['timestamp'] if since is not None else None
+    revisions = []
 
-    try:
-        prev = response["continue"]["rvcontinue"]
-    except:
-        prev = ""
-    
-    if prev == "":
-        return revisions
-    
-    else:
-        revisions.extend(get_revisions_detailed(article, lang, prev))
-        return revisions
+    async for response in iter_query_async(lang, revisions_params(articleTitle, user=user, end=end)):
+        page = filter_new_revisions(get_page_revisions(response), since)
+
+        if on_page is None:
+            revisions.extend(page)
+        else:
+            await asyncio.to_thread(on_page, page)
+
+    return revisions
+
+# maximum number of article-language pairs fetched at once, bounds memory held by partially fetched histories
+MAX_ACTIVE_PAIRS = 16
+
+async def get_multiple_revisions_async(
+    articles : list,
+    langs : list,
+    watermarks : dict = None,
+    open_writer = None,
+    pairs : list = None) -> tuple[dict, list] :
+
+    """
+    Fetches revisions for every article-language pair concurrently, returns {lang: {article: revisions}} and failed pairs.
+    Pairs with a watermark in {lang: {article: watermark}} only get revisions newer than it.
+    If open_writer(lang, article) is given, each page is passed to the write() method of the writer it returns as soon as it arrives,
+    the writer is closed when the pair completes (discarded when it fails) and revisions are not kept in memory.
+    pairs restricts the run to a list of (lang, article) tuples.
+    """
+
+    watermarks = watermarks or {}
+
+    if pairs is None:
+        pairs = [(l, a) for l in langs for a in articles]
+
+    # one batched lookup fills the title map for all pairs
+    await asyncio.to_thread(resolve_titles, list(dict.fromkeys(a for _, a in pairs)), list(dict.fromkeys(l for l, _ in pairs if l != "en")))
+
+    active_pairs = asyncio.Semaphore(MAX_ACTIVE_PAIRS)
+
+    async def fetch(l, a):
+        async with active_pairs:
+            since = watermarks.get(l, {}).get(a)
+
+            if open_writer is None:
+                return await get_revisions_detailed_async(a, l, since=since)
+
+            writer = await asyncio.to_thread(open_writer, l, a)
+            try:
+                await get_revisions_detailed_async(a, l, since=since, on_page=writer.write)
+            except BaseException:
+                writer.discard()
+                raise
+
+            await asyncio.to_thread(writer.close)
+
+    results = await asyncio.gather(*[fetch(l, a) for l, a in pairs], return_exceptions=True)
+
+    revisions_all = {l: {} for l in dict.fromkeys(l for l, _ in pairs)}
+    failed_runs = []
+
+    for (l, a), revisions in zip(pairs, results):
+
+        if isinstance(revisions, Exception):
+            print("Failed fetching data for {l}/{a}: {e!r}".format(l=l, a=a, e=revisions))
+            failed_runs.append((l, a))
+        elif open_writer is None:
+            revisions_all[l][a] = revisions
+
+    return revisions_all, failed_runs
+
+def get_multiple_revisions(
+    articles : list,
+    langs : list,
+    watermarks : dict = None,
+    open_writer = None,
+    pairs : list = None) -> tuple[dict, list] :
+
+    """Runs get_multiple_revisions_async() and returns revisions of all article-language pairs"""
+
+    return run_async(get_multiple_revisions_async(articles, langs, watermarks, open_writer, pairs))
     
 def count_revisions(articleTitle : str,
     lang: str = "en",
@@ -92,64 +395,219 @@ def transform_revisions_detailed(
     revisions_raw : list,
 ) -> pd.DataFrame:
     
-    """Transforms the revisions history for an article"""
-    
-    df_list = []
-    for r in revisions_raw:
-
-        r['reverted'] = 1 if 'mw-reverted' in r['tags'] else 0
-        r['reversion'] = 1 if ('mw-undo' in r['tags'] )| ('mw-manual-revert' in r['tags']) else 0
-        r['article'] = articleTitle
-        r['language'] = lang
-        r['timestamp'] = datetime.strptime(r['timestamp'], "%Y-%m-%dT%H:%M:%SZ")
-        if 'userhidden' in r.keys():
-            r['user'] = ""
-        r = {key: value for key, value in r.items() if key in ['article', 'language', 'user', 'timestamp', 'size', 'reverted', 'reversion']}
-        df_list.append(r)
-    
+    """
+    Transforms the revisions history for an article.
+    Columns are built as typed arrays in one pass over the raw revisions, tags are matched on a flattened index.
+    Revisions delivered twice (i.e. by overlapping pages of a resumed run) are dropped by revid.
+    """
+
+    seen = set()
+    revisions_raw = [r for r in revisions_raw if not (r['revid'] in seen or seen.add(r['revid']))]
+
+    n = len(revisions_raw)
+
+    if n == 0:
+        return pd.DataFrame()
+
+    revids = np.fromiter((r['revid'] for r in revisions_raw), dtype=np.int64, count=n)
+    # 0 for the revision which created the page
+    parentids = np.fromiter((r.get('parentid', 0) for r in revisions_raw), dtype=np.int64, count=n)
+
+    users = np.array([r.get('user', "") for r in revisions_raw], dtype=object)
+    hidden = np.fromiter(('userhidden' in r for r in revisions_raw), dtype=bool, count=n)
+    users[hidden] = ""
+
+    # "2024-06-28T17:03:13Z" without the trailing Z is parsed by numpy directly
+    timestamps = np.array([r['timestamp'][:-1] for r in revisions_raw], dtype='datetime64[s]').astype('datetime64[ns]')
+    sizes = np.fromiter((r['size'] for r in revisions_raw), dtype=np.int64, count=n)
+
+    # tags of all revisions in one flat array, owner holds the position of the revision each tag belongs to
+    tags = [r['tags'] for r in revisions_raw]
+    owner = np.repeat(np.arange(n), np.fromiter(map(len, tags), dtype=np.int64, count=n))
+    flat_tags = np.array(list(itertools.chain.from_iterable(tags)), dtype=object)
 
-    return pd.DataFrame(df_list)
+    reverted = np.zeros(n, dtype=np.int64)
+    reverted[owner[flat_tags == 'mw-reverted']] = 1
+
+    reversion = np.zeros(n, dtype=np.int64)
+    reversion[owner[np.isin(flat_tags, ['mw-undo', 'mw-manual-revert'])]] = 1
+
+    return pd.DataFrame({
+        'revid': revids,
+        'parentid': parentids,
+        'user': users,
+        'timestamp': timestamps,
+        'size': sizes,
+        'reverted': reverted,
+        'reversion': reversion,
+        'article': articleTitle,
+        'language': lang,
+    })
 
 ## Functions to retrieve and transform user edits
 
+# maximum number of names accepted by the ususers parameter
+USERS_BATCH_SIZE = 50
+
+# edit counts of users kept across runs and topics, keyed by user and language
+USERS_STORE_PATH = "data/users.sqlite"
+
+# stored edit counts older than USERS_MAX_AGE seconds are fetched again, None never refetches
+USERS_MAX_AGE = 30 * 24 * 3600
+
+def is_anonymous_user(user) -> bool:
+
+    """Returns True for IP addresses, hidden ("") and missing user names, which have no edit count to look up"""
+
+    if not isinstance(user, str) or user == "":
+        return True
+
+    try:
+        ipaddress.ip_address(user)
+        return True
+    except ValueError:
+        return False
+
+def get_users_edits_batch(users : list, lang : str) -> dict:
+
+    """Returns {user: editcount} for up to USERS_BATCH_SIZE registered users with a single request"""
+
+    params = {"action": "query", "list": "users", "usprop": "editcount", "ususers": "|".join(users), "format": "json"}
+
+    response = api_get(api_url(lang), params)
+
+    # the API returns normalized names, i.e. "Some_user" -> "Some user"
+    normalized = {d['to']: d['from'] for d in response['query'].get('normalized', [])}
+
+    edits = {}
+    for u in response['query']['users']:
+        edits[normalized.get(u['name'], u['name'])] = u.get('editcount', 0)
+
+    return edits
+
 def get_user_edits_count(user : str, lang : str) -> int:
 
     """Returns count of all edits a user has made on all articles on inputted language version wikipedia"""
 
-    query = "https://{lang}.wikipedia.org/w/api.php?action=query&list=users&usprop=editcount&ususers={user}&format=json".format(user=user, lang=lang)    
+    if is_anonymous_user(user):
+        return 0
 
     try:
-        response = req.get(query).json()
-        return response['query']['users'][0]['editcount']
-    except:
+        return get_users_edits_batch([user], lang).get(user, 0)
+    except (req.RequestException, ThrottledError, CacheMissError, KeyError):
         return 0
 
-def get_users_edits_count(users : list, lang : str) -> pd.DataFrame:
+def open_users_store(path : str = USERS_STORE_PATH) -> sqlite3.Connection:
 
-    """Returns count of edits for each user in inputted list by calling get_user_edits_count() repeatedly"""
-    
-    users_edits = []
-    
-    ct=0
+    """Opens the store of users' edit counts, creating it on first use"""
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS users (user TEXT, language TEXT, editcount INTEGER, fetched_at REAL, PRIMARY KEY (user, language))"
+    )
+
+    return connection
+
+def load_users_edits(users : list, lang : str, max_age : float = USERS_MAX_AGE, path : str = USERS_STORE_PATH) -> dict:
+
+    """Returns {user: editcount} of inputted users which are stored and were fetched less than max_age seconds ago"""
+
+    oldest = 0.0 if max_age is None else tm.time() - max_age
+    edits = {}
+
+    with closing(open_users_store(path)) as connection:
+        # in chunks to stay below SQLite's limit of query parameters
+        for i in range(0, len(users), 500):
+            chunk = users[i:i + 500]
+            rows = connection.execute(
+                "SELECT user, editcount FROM users WHERE language = ? AND fetched_at >= ? AND user IN ({q})".format(q=",".join("?" * len(chunk))),
+                [lang, oldest] + chunk,
+            )
+            edits.update(dict(rows))
+
+    return edits
+
+def save_users_edits(edits : dict, lang : str, path : str = USERS_STORE_PATH):
+
+    """Stores {user: editcount} of one language version with the current time"""
+
+    now = tm.time()
+
+    with closing(open_users_store(path)) as connection, connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+            [(user, lang, editcount, now) for user, editcount in edits.items()],
+        )
+
+def get_users_edits_count(users : list, lang : str, max_age : float = USERS_MAX_AGE, store : bool = True) -> pd.DataFrame:
+
+    """
+    Returns count of edits for each user in inputted list, registered users are looked up USERS_BATCH_SIZE at a time.
+    With store = True counts fetched less than max_age seconds ago are taken from the users store
+    and only missing or stale users are requested, fetched counts are added to the store.
+    """
+
+    registered = [u for u in users if not is_anonymous_user(u)]
+    edits = {}
+
+    if store:
+        edits = load_users_edits(registered, lang, max_age)
+        registered = [u for u in registered if u not in edits]
+        print("Edit counts of {c} users of {l} are stored, {n} are fetched".format(c = len(edits), l = lang, n = len(registered)))
+
+    fetched = {}
+
+    for i in range(0, len(registered), USERS_BATCH_SIZE):
+        batch = registered[i:i + USERS_BATCH_SIZE]
+
+        try:
+            fetched.update(get_users_edits_batch(batch, lang))
+        except (req.RequestException, ThrottledError, CacheMissError, KeyError) as e:
+            print("Failed fetching edit counts for {n} users: {e!r}".format(n=len(batch), e=e))
+
+        if (i // USERS_BATCH_SIZE + 1) % 20 == 0:
+            print("Data for {c}/{t} users extracted".format( c = i + len(batch), t = len(registered) ))
 
-    for user in users:
-        ct+=1
-        total_edits = get_user_edits_count(user, lang)
+    # users whose batch failed are not stored and will be requested again
+    if store and fetched:
+        save_users_edits(fetched, lang)
 
-        if ct % 100 == 0:
-            tm.sleep(20)
-            print("Data for {c}/{t} users extracted".format( c = ct, t = len(users) ))
+    edits.update(fetched)
 
-        append_dict = {'user': user, 'language' : lang, 'total_edits' : total_edits}
-        users_edits.append(append_dict)        
+    users_edits = [{'user': user, 'language' : lang, 'total_edits' : edits.get(user, 0)} for user in users]
 
     return pd.DataFrame(users_edits)
 
-def join_users_edits(lang : str, revisions : pd.DataFrame) -> pd.DataFrame:
+def iter_user_contribs(user : str, lang : str) -> Iterator[list]:
+
+    """Yields contributions of a user one page (up to 500 edits) at a time, newest first"""
+
+    params = {"action": "query", "list": "usercontribs", "ucuser": user, "uclimit": 500, "format": "json"}
+
+    for response in iter_query(lang, params):
+        yield response['query']['usercontribs']
+
+def get_user_edits(user : str, lang : str) -> list:
+
+    """Returns list of all contributions of a user on inputted language version wikipedia"""
+
+    contribs = []
+
+    for page in iter_user_contribs(user, lang):
+        contribs.extend(page)
+
+    return contribs
+
+def join_users_edits(lang : str, revisions : pd.DataFrame, max_age : float = USERS_MAX_AGE) -> pd.DataFrame:
+
+    """Adds total_edits of every user, only users missing from the users store or older than max_age seconds are fetched"""
 
     unique_users = list(revisions['user'].unique())
 
-    user_edits = get_users_edits_count(unique_users, lang)
+    user_edits = get_users_edits_count(unique_users, lang, max_age)
 
     merged_df = pd.merge(revisions, user_edits, how = 'left', on = ['user', 'language'])
 
@@ -157,43 +615,99 @@ def join_users_edits(lang : str, revisions : pd.DataFrame) -> pd.DataFrame:
 
 ## Functions to pull and transform protection logs
 
+def protections_params(title : str) -> dict:
+
+    """Returns query parameters for the protection log of a page"""
+
+    return {
+        "action": "query",
+        "list": "logevents",
+        "letype": "protect",
+        "letitle": title,
+        "format": "json",
+        "lelimit": 500,
+        "leprop": "title|type|user|timestamp|comment|details",
+    }
+
 def pull_protections(article : str, lang : str):
 
+    """Returns all protection logs of an article (following continuation), None if the language version does not exist"""
+
     if lang != 'en':
         try:
             article = get_article_name(article, "en", lang)
-        except:
+        except TitleNotFoundError:
             return None
-    
-    query = 'https://{lang}.wikipedia.org/w/api.php?action=query&list=logevents&letype=protect&letitle={article}&format=json&lelimit=500&leprop=title|type|user|timestamp|comment|details'.format(
-        lang=lang, article=article
-    )
 
-    response = req.get(query).json()
+    logevents = []
+
+    for response in iter_query(lang, protections_params(article)):
+        logevents.extend(response['query']['logevents'])
+
+    return logevents
+
+async def pull_protections_async(article : str, lang : str) -> dict:
+
+    """
+    Pulls all protection logs of an article and returns a structured result
+    {'status': ..., 'logevents': [...], 'pages': ..., 'error': ...} where status is
+    'complete', 'missing' (no such language version), 'truncated' (failed after some pages) or 'failed'.
+    """
+
+    result = {'status': 'complete', 'logevents': [], 'pages': 0, 'error': None}
 
     try:
-        logevents = response['query']['logevents']
-        return logevents
-    except:
-        print(response)
-        return None
+        async with get_host_semaphore(api_url("en")):
+            title = await asyncio.to_thread(get_revisions_title, article, lang)
+    except TitleNotFoundError as e:
+        return dict(result, status='missing', logevents=None, error=str(e))
 
-def pull_multiple_protections(articles : list, langs : list) -> dict :
+    try:
+        async for response in iter_query_async(lang, protections_params(title)):
+            result['logevents'].extend(response['query']['logevents'])
+            result['pages'] += 1
 
-    output_dict = {}
+    except (req.RequestException, ThrottledError, CacheMissError, KeyError) as e:
+        result['status'] = 'truncated' if result['pages'] > 0 else 'failed'
+        result['error'] = repr(e)
 
-    for a in articles:
-        output_dict[a] = {}
+    return result
 
-        for l in langs:
+async def pull_multiple_protections_async(articles : list, langs : list) -> dict :
+
+    """Pulls protection logs of all article-language pairs concurrently, returns {article: {lang: result of pull_protections_async()}}"""
+
+    pairs = [(a, l) for a in articles for l in langs]
+
+    await asyncio.to_thread(resolve_titles, articles, [l for l in langs if l != "en"])
+
+    results = await asyncio.gather(*[pull_protections_async(a, l) for a, l in pairs])
+
+    output_dict = {a: {} for a in articles}
+
+    for (a, l), result in zip(pairs, results):
+        output_dict[a][l] = result
+
+        if result['status'] in ('truncated', 'failed'):
+            print("Protection logs for {l}/{a} {s}: {e}".format(l=l, a=a, s=result['status'], e=result['error']))
 
-            try:
-                output_dict[a][l] = pull_protections(a,l)
-            except:
-                output_dict[a][l] = {}
-    
     return output_dict
-    
+
+def pull_multiple_protections(articles : list, langs : list) -> dict :
+
+    """Runs pull_multiple_protections_async()"""
+
+    return run_async(pull_multiple_protections_async(articles, langs))
+
+def get_protections_list(result) -> list:
+
+    """Returns protection logs from a structured pull result or from raw files written before results were structured"""
+
+    if isinstance(result, dict):
+        return result.get('logevents')
+
+    return result
+
 def transform_protections(input_list : list, lang : str) -> pd.DataFrame :
 
     output_list = []
@@ -234,51 +748,54 @@ def transform_protections(input_list : list, lang : str) -> pd.DataFrame :
 
     return pd.DataFrame(output_list)
 
-def transform_multiple_protections(input_dict : dict):
+def transform_multiple_protections(input_dict : dict) -> pd.DataFrame:
+
+    """Transforms protection logs of all articles and languages, the partial tables are concatenated once at the end"""
+
+    output_dfs = []
 
     for a, d in input_dict.items():
         for l, log in d.items():          
 
-            df_log = transform_protections(log, l)
+            df_log = transform_protections(get_protections_list(log), l)
 
             if isinstance(df_log, pd.DataFrame):
                 
                 df_log['article'] = a
+                output_dfs.append(df_log)
 
-                try:
+    if len(output_dfs) == 0:
+        return pd.DataFrame()
 
-                    output_df = pd.concat([output_df, df_log], ignore_index=True)
-                except:
-                    output_df = df_log
-    
-    return output_df
+    return pd.concat(output_dfs, ignore_index=True)
 
-def extract_expiry(log : dict, lang : str):
+def extract_expiry(log : dict, lang : str) -> datetime :
 
-    # easiest way:
-    try:
-        expiry_str = [d['expiry'] for d in log['parmas']['details']]
-        expiry = [convert_log_to_datetime(e, lang, True) for e in expiry_str]
-    except:
-
-        if log['params'] != {} and 'description' in log['params'].keys():
-            expiry_str = log['params']['description']
-            
-        elif 'comment' in log.keys():
-            expiry_str = log['comment']
-        else:
-            print(log)
-            return None
-        
-        try:
-            expiry = convert_log_to_datetime(expiry_str, lang, False)
-        except:
-            print(expiry_str)
-            expiry=None
-    
-    return expiry
-    
-## Some ad hoc lists and dictionaries
+    """
+    Returns the expiry of a protection log, INFINITE_EXPIRY for protections without expiry.
+    The structured details are used when available, otherwise the expiry is parsed from the description or comment.
+    """
+
+    params = log.get('params')
+    if not isinstance(params, dict):
+        params = {}
+
+    # easiest way: first protection type, the same one the description starts with
+    if params.get('details'):
+        return parse_expiry_details(params['details'][0]['expiry'])
+
+    if 'description' in params:
+        return parse_expiry_text(params['description'], lang)
+
+    if 'comment' in log:
+        return parse_expiry_text(log['comment'], lang)
+
+    return None
+
+## Tables for parsing protection expiries
+
+# date used for protections without expiry
+INFINITE_EXPIRY = datetime(2029, 12, 31, 23, 59, 59)
 
 infinite_options = [
     "indefinite",
@@ -290,172 +807,143 @@ infinite_options = [
     "do odvolání",
     "na zawsze",
     "infinito",
-    "infinite"
+    "infinite",
+    "infinity",
 ]
 
-russian_genitive_months = {
-    "января": "январь",
-    "февраля": "февраль",
-    "марта": "март",
-    "апреля": "апрель",
-    "мая": "май",
-    "июня": "июнь",
-    "июля": "июль",
-    "августа": "август",
-    "сентября": "сентябрь",
-    "октября": "октябрь",
-    "ноября": "ноябрь",
-    "декабря": "декабрь",
+# names of the twelve months in every supported language, nominative, genitive and abbreviated forms
+month_names = {
+    "en": [
+        ["january", "jan"], ["february", "feb"], ["march", "mar"], ["april", "apr"], ["may"], ["june", "jun"],
+        ["july", "jul"], ["august", "aug"], ["september", "sep", "sept"], ["october", "oct"], ["november", "nov"], ["december", "dec"],
+    ],
+    "de": [
+        ["januar", "jänner", "jan"], ["februar", "feb"], ["märz", "mär"], ["april", "apr"], ["mai"], ["juni", "jun"],
+        ["juli", "jul"], ["august", "aug"], ["september", "sep", "sept"], ["oktober", "okt"], ["november", "nov"], ["dezember", "dez"],
+    ],
+    "ru": [
+        ["январь", "января"], ["февраль", "февраля"], ["март", "марта"], ["апрель", "апреля"], ["май", "мая"], ["июнь", "июня"],
+        ["июль", "июля"], ["август", "августа"], ["сентябрь", "сентября"], ["октябрь", "октября"], ["ноябрь", "ноября"], ["декабрь", "декабря"],
+    ],
+    "uk": [
+        ["січень", "січня"], ["лютий", "лютого"], ["березень", "березня"], ["квітень", "квітня"], ["травень", "травня"], ["червень", "червня"],
+        ["липень", "липня"], ["серпень", "серпня"], ["вересень", "вересня"], ["жовтень", "жовтня"], ["листопад", "листопада"], ["грудень", "грудня"],
+    ],
+    "ar": [
+        ["يناير"], ["فبراير"], ["مارس"], ["أبريل"], ["مايو"], ["يونيو"],
+        ["يوليو"], ["أغسطس"], ["سبتمبر"], ["أكتوبر"], ["نوفمبر"], ["ديسمبر"],
+    ],
+    "sk": [
+        ["január", "januára"], ["február", "februára"], ["marec", "marca"], ["apríl", "apríla"], ["máj", "mája"], ["jún", "júna"],
+        ["júl", "júla"], ["august", "augusta"], ["september", "septembra"], ["október", "októbra"], ["november", "novembra"], ["december", "decembra"],
+    ],
+    "pl": [
+        ["styczeń", "stycznia", "sty"], ["luty", "lutego", "lut"], ["marzec", "marca", "mar"], ["kwiecień", "kwietnia", "kwi"], ["maj", "maja"], ["czerwiec", "czerwca", "cze"],
+        ["lipiec", "lipca", "lip"], ["sierpień", "sierpnia", "sie"], ["wrzesień", "września", "wrz"], ["październik", "października", "paź"], ["listopad", "listopada", "lis"], ["grudzień", "grudnia", "gru"],
+    ],
+    "cs": [
+        ["leden", "ledna"], ["únor", "února"], ["březen", "března"], ["duben", "dubna"], ["květen", "května"], ["červen", "června"],
+        ["červenec", "července"], ["srpen", "srpna"], ["září"], ["říjen", "října"], ["listopad", "listopadu"], ["prosinec", "prosince"],
+    ],
+    "it": [
+        ["gennaio", "gen"], ["febbraio", "feb"], ["marzo", "mar"], ["aprile", "apr"], ["maggio", "mag"], ["giugno", "giu"],
+        ["luglio", "lug"], ["agosto", "ago"], ["settembre", "set"], ["ottobre", "ott"], ["novembre", "nov"], ["dicembre", "dic"],
+    ],
 }
 
-ukrainian_genitive_months = {
-    "січня": "Січень",
-    "лютого": "Лютий",
-    "березня": "Березень",
-    "квітня": "Квітень",
-    "травня": "Травень",
-    "червня": "Червень",
-    "липня": "Липень",
-    "серпня": "Серпень",
-    "вересня": "Вересень",
-    "жовтня": "Жовтень",
-    "листопада": "Листопад",
-    "грудня": "Грудень",
-}
+def build_month_numbers(lang : str) -> dict :
 
-arabic_to_english_months = {
-    "يناير": "January",
-    "فبراير": "February",
-    "مارس": "March",
-    "أبريل": "April",
-    "مايو": "May",
-    "يونيو": "June",
-    "يوليو": "July",
-    "أغسطس": "August",
-    "سبتمبر": "September",
-    "أكتوبر": "October",
-    "نوفمبر": "November",
-    "ديسمبر": "December",
-}
+    """Returns {month name: month number} of inputted language, English names are understood in every language"""
 
+    numbers = {}
+    for months in [month_names["en"], month_names.get(lang, [])]:
+        for i, names in enumerate(months):
+            numbers.update({name: i + 1 for name in names})
+
+    return numbers
+
+month_numbers = {lang: build_month_numbers(lang) for lang in month_names}
+
+# the expiry is the first bracketed part of a description, i.e. "[edit=autoconfirmed] (expires 17:03, 28 July 2024 (UTC))"
+expiry_bracket = re.compile(r"\(([^\)]+)\)")
+
+# "17:03, 28 July 2024", "17:03, 28. júla 2024", "17:03، 28 يوليو 2024"
+expiry_time_first = re.compile(
+    r"(?P<hour>\d{1,2}):(?P<minute>\d{2})[,،]?\s+(?P<day>\d{1,2})\.?\s+(?P<month>[^\W\d_]+)\.?,?\s+(?P<year>\d{4})"
+)
+
+# "28. Juli 2024, 17:03 Uhr", "28 lug 2024 alle 17:03", "28. 7. 2024, 17:03"
+expiry_date_first = re.compile(
+    r"(?P<day>\d{1,2})\.?\s+(?P<month>[^\W\d_]+|\d{1,2})\.?,?\s+(?P<year>\d{4}),?\s+(?:[^\W\d_]+\s+)?(?P<hour>\d{1,2}):(?P<minute>\d{2})"
+)
+
+expiry_patterns = [expiry_time_first, expiry_date_first]
+
+def parse_expiry_details(expiry : str) -> datetime :
+
+    """Converts the expiry of ['params']['details'] ("2024-07-28T17:03:12Z" or "infinite")"""
+
+    if expiry in infinite_options:
+        return INFINITE_EXPIRY
+
+    try:
+        return datetime.strptime(expiry, "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return None
+
+@lru_cache(maxsize=65536)
+def parse_expiry_text(log_str : str, lang : str = "en") -> datetime :
 
-def convert_log_to_datetime(log_str: str, lang : str = "en", from_details : bool = False) -> datetime:
-    
     """
-    Helper function to retrieve datetime limits from protection logs
+    Parses the expiry from the description or comment of a protection log in inputted language, None if it is not found.
+    Uses only precompiled patterns and month tables, so it does not depend on installed locales and is safe to run in threads.
     """
 
-    if from_details: # converts ['params']['details']
-        if log_str == "infinite":
-            return datetime(2029, 12, 31, 23, 59, 59)
+    match = expiry_bracket.search(log_str or "")
+    if match is None:
+        return None
 
-        else:
-            try:
-                return datetime.strptime(
-                    log_str, "%Y-%m-%dT%H:%M:%SZ"
-                )
-            except:
-                print(log_str)
-                return None
-        
-    format_time = "%H:%M, %d %B %Y"
+    expiry = match.group(1).strip().lower()
 
-    if lang == "en":
-        locale.setlocale(locale.LC_ALL, "en_US")
-        log_str = log_str.replace("expires ", "")
+    if any(option in expiry for option in infinite_options):
+        return INFINITE_EXPIRY
 
-    elif lang == "de":
-        locale.setlocale(locale.LC_ALL, "de_DE")
-        log_str = log_str.replace("bis ", "")
-        log_str = log_str.replace(" Uhr", "")
+    months = month_numbers.get(lang, month_numbers["en"])
 
-        format_time = "%d. %B %Y, %H:%M"
+    for pattern in expiry_patterns:
+        match = pattern.search(expiry)
+        if match is None:
+            continue
 
-    elif lang == "ru":
-        locale.setlocale(locale.LC_ALL, "ru_RU")
-        log_str = log_str.replace("истекает ", "")
+        month = match.group('month')
+        month = int(month) if month.isdigit() else months.get(month)
 
-        log_str = re.sub(
-            r"\b" + r"|\b".join(russian_genitive_months) + r"\b",
-            lambda m: russian_genitive_months.get(m.group(), m.group()),
-            log_str,
-        )
+        try:
+            return datetime(int(match.group('year')), month, int(match.group('day')), int(match.group('hour')), int(match.group('minute')))
+        except (TypeError, ValueError):
+            continue
 
-    elif lang == "uk":
-        locale.setlocale(locale.LC_ALL, "uk_UA")
-        log_str = log_str.replace("закінчується ", "")
+    return None
 
-        log_str = re.sub(
-            r"\b" + r"|\b".join(ukrainian_genitive_months) + r"\b",
-            lambda m: ukrainian_genitive_months.get(m.group(), m.group()),
-            log_str,
-        )
+def parse_expiries(log_strs, lang : str = "en") -> pd.Series :
 
-    elif lang == "ar":
-        locale.setlocale(locale.LC_ALL, "ar")
-        log_str = log_str.replace("تنتهي في ", "")
-        log_str = log_str.replace("،", ",")
-        log_str = re.sub(
-            r"\b" + r"|\b".join(arabic_to_english_months) + r"\b",
-            lambda m: arabic_to_english_months.get(m.group(), m.group()),
-            log_str,
-        )
-        locale.setlocale(locale.LC_ALL, "en_US")
-        format_time = "%H:%M, %d %b %Y"
-
-    elif lang == "sk":
-        locale.setlocale(locale.LC_ALL, "sk")
-        log_str = log_str.replace("vyprší o ", "")
-        format_time = "%H:%M, %d. %B %Y"
-
-    elif lang == "pl":
-        locale.setlocale(locale.LC_ALL, "pl")
-        log_str = log_str.replace("wygasa ", "")
-        format_time = "%H:%M, %d %b %Y"
-
-    elif lang == "cs":
-        locale.setlocale(locale.LC_ALL, "cs")
-        log_str = log_str.replace("vyprší v ", "")
-        format_time = "%d. %m. %Y, %H:%M"
-
-    elif lang == "it":
-        locale.setlocale(locale.LC_ALL, "it")
-        log_str = log_str.replace("scade il ", "")
-        log_str = log_str.replace("scade ", "")
-        log_str = log_str.replace("alle ", "")
-        format_time = "%d %b %Y %H:%M"
-
-    p = r"\(([^\)]+)\)"
-    match = re.search(p, log_str).group(1)
-
-    if (
-        match == "indefinite"
-        or match == "unbeschränkt"
-        or match == "безстроково"
-        or match == "غير محدد"
-        or match == "бессрочно"
-        or match == "na neurčito"
-        or match == "do odvolání"
-        or match == "na zawsze"
-        or match == "infinito"
-    ):
-        return datetime(2029, 12, 31, 23, 59, 59)
-
-    match = match.replace(" (UTC", "")
-
-    date_string = match  # [8:-5]  # remove expires and UTC substrings
-
-    format_times = ["%H:%M, %d %B %Y", format_time, "%H:%M, %d %b %Y"]
-    for f in format_times:
-        try:
-            date_dt = datetime.strptime(date_string, f)
-            break
-        except:
-            next
+    """Parses a column of descriptions or comments at once, every distinct text is parsed only once"""
+
+    log_strs = pd.Series(log_strs)
+    parsed = {s: parse_expiry_text(s, lang) for s in log_strs.dropna().unique()}
 
-    locale.setlocale(locale.LC_ALL, "en_US")
+    return pd.to_datetime(log_strs.map(parsed))
+
+def convert_log_to_datetime(log_str: str, lang : str = "en", from_details : bool = False) -> datetime:
+    
+    """
+    Helper function to retrieve datetime limits from protection logs
+    """
+
+    if from_details: # converts ['params']['details']
+        return parse_expiry_details(log_str)
 
-    return date_dt
+    return parse_expiry_text(log_str, lang)
 
 
 
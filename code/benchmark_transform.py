@@ -0,0 +1,60 @@
+## Benchmark of the protection transform: cost per article should stay flat as the number of articles grows
+import io
+import time as tm
+import pandas as pd
+from contextlib import redirect_stdout
+from api_functions import *
+
+def make_protections(n_articles : int, langs : list = ["en", "de"], logs : int = 5) -> dict:
+
+    """Returns synthetic raw protection logs in the format of pull_multiple_protections()"""
+
+    log = {
+        "title": "Article",
+        "params": {"details": [{"type": "edit", "level": "autoconfirmed", "expiry": "2024-07-28T17:03:12Z"}]},
+        "type": "protect",
+        "action": "protect",
+        "user": "Admin",
+        "timestamp": "2024-06-28T17:03:13Z",
+        "comment": "Edit war",
+    }
+
+    return {"Article_{i}".format(i=i): {l: [dict(log) for _ in range(logs)] for l in langs} for i in range(n_articles)}
+
+def transform_protections_concat_in_loop(input_dict : dict) -> pd.DataFrame:
+
+    """Previous implementation, grows the output table inside the loop"""
+
+    for a, d in input_dict.items():
+        for l, log in d.items():
+            df_log = transform_protections(log, l)
+            if isinstance(df_log, pd.DataFrame):
+                df_log['article'] = a
+                try:
+                    output_df = pd.concat([output_df, df_log], ignore_index=True)
+                except NameError:
+                    output_df = df_log
+
+    return output_df
+
+def benchmark(sizes : list = [40, 400, 4000]) -> pd.DataFrame:
+
+    rows = []
+
+    for n in sizes:
+        input_dict = make_protections(n)
+
+        for name, function in [("concat in loop", transform_protections_concat_in_loop), ("collect then concat", transform_multiple_protections)]:
+            # expiry parsing may print unparsed logs, which would only add noise here
+            with redirect_stdout(io.StringIO()):
+                start = tm.perf_counter()
+                function(input_dict)
+                elapsed = tm.perf_counter() - start
+
+            rows.append({'method': name, 'articles': n, 'seconds': elapsed, 'ms_per_article': 1000 * elapsed / n})
+
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+
+    print(benchmark().to_string(index=False))
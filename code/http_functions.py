@@ -0,0 +1,385 @@
+## Here the request layer shared by all API helpers is defined
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import zlib
+import time as tm
+import requests as req
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+## Endpoints and limits
+
+# MediaWiki action API, can be pointed to a local stub server for testing
+API_URL = "https://{lang}.wikipedia.org/w/api.php"
+
+# Wikimedia core REST API
+REST_URL = "https://api.wikimedia.org/core/v1/wikipedia/{lang}"
+
+# maximum number of requests in flight against a single host
+HOST_CONCURRENCY = 4
+
+# ask MediaWiki to refuse requests while its replicas lag more than MAXLAG seconds
+MAXLAG = 5
+
+# token bucket settings in requests per second and host, see TokenBucket
+INITIAL_RATE = 5.0
+MIN_RATE = 0.2
+MAX_RATE = 20.0
+RATE_STEP = 0.2
+BURST = 5
+
+# number of retries of a throttled request before giving up
+MAX_RETRIES = 6
+
+# optional response cache, see enable_cache()
+CACHE_PATH = "data/cache/responses.sqlite"
+CACHE_TTL = 7 * 24 * 3600
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+HEADERS = {"User-Agent": "WikiEdits/1.0 (https://github.com/Rrisko/WikiEdits)"}
+
+session = req.Session()
+session.headers.update(HEADERS)
+
+## Throttling
+
+class ThrottledError(Exception):
+    pass
+
+class TokenBucket:
+
+    """
+    Token bucket of one host. The rate is halved whenever the server throttles a request
+    and grows back by RATE_STEP with every successful one.
+    """
+
+    def __init__(self, rate : float = INITIAL_RATE):
+        self.rate = rate
+        self.tokens = float(BURST)
+        self.updated = tm.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+
+        """Blocks until a token is available, returns seconds spent waiting"""
+
+        with self.lock:
+            now = tm.monotonic()
+            self.tokens = min(BURST, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            wait = max(-self.tokens / self.rate, self.blocked_until - now, 0.0)
+
+        if wait > 0:
+            tm.sleep(wait)
+
+        return wait
+
+    def slow_down(self, retry_after : float):
+
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, tm.monotonic() + retry_after)
+
+    def speed_up(self):
+
+        with self.lock:
+            self.rate = min(MAX_RATE, self.rate + RATE_STEP)
+
+buckets = {}
+request_stats = {}
+buckets_lock = threading.Lock()
+
+def get_bucket(url : str) -> TokenBucket:
+
+    """Returns the token bucket of the host of inputted url"""
+
+    host = get_host(url)
+
+    with buckets_lock:
+        if host not in buckets:
+            buckets[host] = TokenBucket()
+        return buckets[host]
+
+def get_host_stats(url : str) -> dict:
+
+    """Returns request statistics collected for the host of inputted url"""
+
+    host = get_host(url)
+
+    with buckets_lock:
+        if host not in request_stats:
+            request_stats[host] = {'requests': 0, 'cache_hits': 0, 'retries': 0, 'throttled': 0.0, 'latencies': []}
+        return request_stats[host]
+
+## Response cache
+
+class CacheMissError(LookupError):
+    pass
+
+cache = None
+
+class ResponseCache:
+
+    """
+    SQLite store of decoded API responses keyed by the normalized query url, responses with an error are not stored.
+    Entries older than ttl seconds are ignored, least recently used entries are evicted above max_bytes.
+    With offline = True a miss raises CacheMissError instead of going to the network.
+    """
+
+    def __init__(self, path : str = CACHE_PATH, ttl : float = CACHE_TTL, max_bytes : int = CACHE_MAX_BYTES, offline : bool = False):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body BLOB, size INTEGER, created REAL, accessed REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key : str) -> dict:
+
+        """Returns the cached response, None when it is missing or expired"""
+
+        with self.lock:
+            row = self.connection.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row is None or (self.ttl is not None and tm.time() - row[1] > self.ttl):
+                return None
+
+            self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (tm.time(), key))
+            self.connection.commit()
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key : str, response : dict):
+
+        body = zlib.compress(json.dumps(response).encode("utf-8"))
+        now = tm.time()
+
+        with self.lock:
+            old = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, body, len(body), now, now))
+            self.size += len(body) - (old[0] if old else 0)
+
+            if self.max_bytes is not None and self.size > self.max_bytes:
+                self.evict()
+
+            self.connection.commit()
+
+    def evict(self):
+
+        """Deletes least recently used entries until the cache is below 90 % of max_bytes"""
+
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.size -= size
+
+def enable_cache(path : str = CACHE_PATH, ttl : float = CACHE_TTL, max_bytes : int = CACHE_MAX_BYTES, offline : bool = False) -> ResponseCache:
+
+    """Routes all requests of api_get() through a response cache, offline = True serves from the cache only"""
+
+    global cache
+    cache = ResponseCache(path, ttl, max_bytes, offline)
+
+    return cache
+
+def disable_cache():
+
+    global cache
+    cache = None
+
+def cache_key(url : str, params : dict = None) -> str:
+
+    """Returns the query url with parameters in sorted order"""
+
+    return req.Request("GET", url, params=sorted((params or {}).items())).prepare().url
+
+## Synchronous requests
+
+def api_url(lang : str) -> str:
+
+    """Returns the action API endpoint of inputted language version"""
+
+    return API_URL.format(lang=lang)
+
+def rest_url(lang : str) -> str:
+
+    """Returns the core REST API endpoint of inputted language version"""
+
+    return REST_URL.format(lang=lang)
+
+def get_host(url : str) -> str:
+
+    """Returns the host part of an url, i.e. 'de.wikipedia.org'"""
+
+    return urlsplit(url).netloc
+
+def api_get(url : str, params : dict = None) -> dict:
+
+    """
+    Sends a GET request and returns the decoded json response.
+    Waits for a token of the host's bucket first, throttled responses (HTTP 429/503, maxlag) are retried.
+    """
+
+    stats = get_host_stats(url)
+
+    if cache is not None:
+        key = cache_key(url, params)
+        response = cache.get(key)
+
+        if response is not None:
+            stats['cache_hits'] += 1
+            return response
+
+        if cache.offline:
+            raise CacheMissError("{key} is not cached".format(key=key))
+
+    if params is not None and "action" in params:
+        params = dict(params, maxlag=MAXLAG)
+
+    bucket = get_bucket(url)
+
+    for attempt in range(MAX_RETRIES + 1):
+
+        stats['throttled'] += bucket.acquire()
+
+        start = tm.monotonic()
+        response = session.get(url, params=params, timeout=60)
+        stats['latencies'].append(tm.monotonic() - start)
+        stats['requests'] += 1
+
+        # the body is decoded once, both the throttling check and the caller use it
+        body = decode_json(response)
+        retry_after = get_retry_after(response, body, attempt)
+
+        if retry_after is None:
+            bucket.speed_up()
+            response.raise_for_status()
+            response = body if body is not None else response.json()
+
+            # errors like missingtitle or internal_api_error may be transient and are not replayed from the cache
+            if cache is not None and not (isinstance(response, dict) and "error" in response):
+                cache.put(key, response)
+
+            return response
+
+        stats['retries'] += 1
+        bucket.slow_down(retry_after)
+
+    raise ThrottledError("Gave up on {url} after {n} throttled attempts".format(url=url, n=MAX_RETRIES + 1))
+
+def decode_json(response : req.Response) -> dict:
+
+    """Returns the decoded json body of a response, None if it is not json"""
+
+    if "json" not in response.headers.get("Content-Type", ""):
+        return None
+
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def get_retry_after(response : req.Response, body : dict, attempt : int) -> float:
+
+    """Returns seconds to wait if the server throttled the request, None otherwise"""
+
+    throttled = response.status_code in (429, 503)
+
+    # maxlag and ratelimited errors come with HTTP 200
+    if not throttled:
+        error = body.get("error") if isinstance(body, dict) else None
+        throttled = isinstance(error, dict) and error.get("code") in ("maxlag", "ratelimited")
+
+    if not throttled:
+        return None
+
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return float(2 ** attempt)
+
+def reset_request_stats():
+
+    """Clears the request statistics, so that the summary covers only the requests of the next run"""
+
+    with buckets_lock:
+        request_stats.clear()
+
+def summarise_request_stats() -> pd.DataFrame:
+
+    """Returns request count, retries, latency and time spent throttled for each host"""
+
+    rows = []
+    for host, stats in request_stats.items():
+        latencies = pd.Series(stats['latencies'], dtype=float)
+        rows.append({
+            'host': host,
+            'requests': stats['requests'],
+            'cache_hits': stats['cache_hits'],
+            'retries': stats['retries'],
+            'mean_latency': latencies.mean(),
+            'p95_latency': latencies.quantile(0.95),
+            'throttled_seconds': stats['throttled'],
+            'rate': buckets[host].rate if host in buckets else None,
+        })
+
+    return pd.DataFrame(rows, columns=['host', 'requests', 'cache_hits', 'retries', 'mean_latency', 'p95_latency', 'throttled_seconds', 'rate'])
+
+def print_request_stats():
+
+    """Prints the summary of all requests sent during this run"""
+
+    print("Request statistics (latency and throttled time in seconds): ")
+    print(summarise_request_stats().to_string(index=False))
+
+## Asynchronous requests
+
+host_semaphores = {}
+
+def get_host_semaphore(url : str, limit : int = None) -> asyncio.Semaphore:
+
+    """Returns the semaphore bounding concurrent requests against the host of inputted url"""
+
+    host = get_host(url)
+
+    if host not in host_semaphores:
+        host_semaphores[host] = asyncio.Semaphore(limit or HOST_CONCURRENCY)
+
+    return host_semaphores[host]
+
+async def api_get_async(url : str, params : dict = None) -> dict:
+
+    """Awaitable version of api_get(), at most HOST_CONCURRENCY requests per host run at once"""
+
+    async with get_host_semaphore(url):
+        return await asyncio.to_thread(api_get, url, params)
+
+def run_async(coroutine, workers : int = 32):
+
+    """Runs a coroutine to completion with a thread pool large enough for all hosts"""
+
+    async def runner():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        # semaphores are bound to the loop they were first used in
+        host_semaphores.clear()
+        return await coroutine
+
+    return asyncio.run(runner())
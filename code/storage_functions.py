@@ -0,0 +1,624 @@
+## Here functions for storing and loading transformed data are defined
+import ast
+import gzip
+import json
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from contextlib import closing
+from datetime import datetime
+from typing import Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError: # parquet storage is optional, csv files work without pyarrow
+    pa = None
+
+try:
+    import zstandard
+except ImportError: # zstd compression is optional, gzip is always available
+    zstandard = None
+
+## Compressed newline-delimited json for raw data
+
+# compression of raw data files, "zstd" needs the zstandard package
+RAW_COMPRESSION = "gzip"
+
+RAW_EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+def open_compressed(path : str, mode : str, compression : str = None):
+
+    """Opens a gzip or zstd compressed text file, without compression it is given by the file extension"""
+
+    if compression is None:
+        compression = "zstd" if path.endswith(".zst") else "gzip"
+
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compressed files require zstandard, install it with 'pip install zstandard'")
+        return zstandard.open(path, mode, encoding="utf-8")
+
+    return gzip.open(path, mode, encoding="utf-8")
+
+class NDJSONWriter:
+
+    """
+    Appends one json record per line to a compressed file as records arrive.
+    The file is written under a temporary name and only appears under path after close().
+    """
+
+    def __init__(self, path : str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # the codec follows the final name, the temporary one has no known extension
+        self.file = open_compressed(path + ".tmp", "wt", "zstd" if path.endswith(".zst") else "gzip")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path + ".tmp")
+
+def write_ndjson(path : str, records) -> str:
+
+    """Writes records to a compressed ndjson file one at a time"""
+
+    writer = NDJSONWriter(path)
+    for record in records:
+        writer.write(record)
+    writer.close()
+
+    return path
+
+def iter_ndjson(path : str) -> Iterator:
+
+    """Yields records of a compressed ndjson file one at a time"""
+
+    with open_compressed(path, "rt") as f:
+        for line in f:
+            yield json.loads(line)
+
+## Parquet datasets partitioned by topic, language and article
+
+EDITS_DATASET = "data/detailed_data/edits_parquet"
+PROTECTIONS_DATASET = "data/protection_data/protections_parquet"
+
+PARTITION_COLS = ['topic', 'language', 'article']
+
+# storage types of the detailed edits table
+EDITS_DTYPES = {
+    'user': 'string',
+    'timestamp': 'datetime64[ns]',
+    'size': 'int32',
+    'reverted': 'int8',
+    'reversion': 'int8',
+    'article_edits': 'Int32',
+    'total_edits': 'int32',
+}
+
+def require_pyarrow():
+
+    if pa is None:
+        raise ImportError("Parquet storage requires pyarrow, install it with 'pip install pyarrow'")
+
+def parse_list(value):
+
+    """Returns lists stored as text in csv files ("['edit', 'move']") as lists, empty values as None"""
+
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str) and value.startswith("["):
+        return ast.literal_eval(value)
+
+    return None
+
+def prepare_edits(df : pd.DataFrame, topic : str) -> pd.DataFrame:
+
+    """Casts a detailed edits table to the storage types and adds the topic"""
+
+    df = df.drop(columns=['Unnamed: 0'], errors='ignore').assign(topic=topic)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['total_edits'] = df['total_edits'].fillna(0)
+
+    return df.astype({c: t for c, t in EDITS_DTYPES.items() if c in df.columns})
+
+def prepare_protections(df : pd.DataFrame, topic : str) -> pd.DataFrame:
+
+    """Casts a protections table to the storage types and adds the topic"""
+
+    df = df.drop(columns=['Unnamed: 0'], errors='ignore').assign(topic=topic)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['expiry'] = pd.to_datetime(df['expiry'], errors='coerce')
+    df['type'] = df['type'].map(parse_list)
+    df['level'] = df['level'].map(parse_list)
+
+    for c in ['title', 'user', 'action', 'comment']:
+        df[c] = df[c].astype('string')
+
+    return df
+
+def write_partitioned(df : pd.DataFrame, path : str):
+
+    """
+    Writes a table as a parquet dataset partitioned by topic/language/article.
+    Partitions contained in df replace the stored ones, all others are kept.
+    """
+
+    require_pyarrow()
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partitioning = ds.partitioning(pa.schema([(c, pa.string()) for c in PARTITION_COLS]), flavor="hive")
+
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=partitioning,
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+
+def write_edits(df : pd.DataFrame, topic : str, path : str = EDITS_DATASET):
+
+    write_partitioned(prepare_edits(df, topic), path)
+
+def write_protections(df : pd.DataFrame, topic : str, path : str = PROTECTIONS_DATASET):
+
+    # topics that were never protected have no logs and ETL() passes an empty table without columns
+    if len(df) == 0:
+        return
+
+    write_partitioned(prepare_protections(df, topic), path)
+
+def read_partitioned(path : str, columns : list = None, filters = None) -> pd.DataFrame:
+
+    """
+    Reads a partitioned dataset, only the requested columns are read.
+    filters is a list of (column, operator, value) tuples like [('topic', '==', 'Ukraine'), ('language', 'in', ['en', 'de'])].
+    Filters on topic, language and article skip whole partitions, filters on other columns use parquet statistics.
+    """
+
+    require_pyarrow()
+
+    return pd.read_parquet(path, engine="pyarrow", columns=columns, filters=filters, partitioning="hive")
+
+def dataset_columns(path : str) -> list:
+
+    """Returns the columns of a partitioned dataset, partition keys included"""
+
+    require_pyarrow()
+
+    return ds.dataset(path, format="parquet", partitioning="hive").schema.names
+
+def load_edits(topics : list = None, columns : list = None, filters : list = None, path : str = EDITS_DATASET) -> pd.DataFrame:
+
+    """Loads detailed edits of inputted topics, i.e. load_edits(['Ukraine'], ['article', 'language', 'timestamp'])"""
+
+    filters = list(filters or [])
+    if topics is not None:
+        filters.append(('topic', 'in', list(topics)))
+
+    return read_partitioned(path, columns, filters or None)
+
+def load_protections(topics : list = None, columns : list = None, filters : list = None, path : str = PROTECTIONS_DATASET) -> pd.DataFrame:
+
+    """Loads protection logs of inputted topics"""
+
+    filters = list(filters or [])
+    if topics is not None:
+        filters.append(('topic', 'in', list(topics)))
+
+    return read_partitioned(path, columns, filters or None)
+
+def convert_csv(edits_csv : str = None, protections_csv : str = None, topic : str = ""):
+
+    """Stores tables written by earlier ETL() runs in the parquet datasets"""
+
+    if edits_csv is not None:
+        write_edits(pd.read_csv(edits_csv), topic)
+
+    if protections_csv is not None:
+        write_protections(pd.read_csv(protections_csv), topic)
+
+## SQLite warehouse keyed by revision id
+
+# revision ids are unique within a language version only, edits are keyed by (language, revid)
+
+WAREHOUSE_PATH = "data/warehouse.sqlite"
+
+WAREHOUSE_EDITS_COLUMNS = ['revid', 'parentid', 'user', 'timestamp', 'size', 'reverted', 'reversion', 'article', 'language', 'total_edits', 'article_edits']
+WAREHOUSE_PROTECTIONS_COLUMNS = ['article', 'language', 'title', 'timestamp', 'user', 'action', 'comment', 'type', 'level', 'expiry']
+
+WAREHOUSE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS edits (
+        revid INTEGER, parentid INTEGER, user TEXT, timestamp TEXT, size INTEGER, reverted INTEGER, reversion INTEGER,
+        article TEXT, language TEXT, total_edits INTEGER, article_edits INTEGER,
+        PRIMARY KEY (language, revid)
+    )""",
+    "CREATE INDEX IF NOT EXISTS edits_article_language_timestamp ON edits (article, language, timestamp)",
+    # article_edits is recounted per article, language and user
+    "CREATE INDEX IF NOT EXISTS edits_article_language_user ON edits (article, language, user)",
+    # protection logs are always pulled completely and replace the stored logs of their article-language
+    "CREATE TABLE IF NOT EXISTS protections (article TEXT, language TEXT, title TEXT, timestamp TEXT, user TEXT, action TEXT, comment TEXT, type TEXT, level TEXT, expiry TEXT)",
+    "CREATE INDEX IF NOT EXISTS protections_article_language_timestamp ON protections (article, language, timestamp)",
+    # an article-language can belong to several topics, its edits are stored once
+    "CREATE TABLE IF NOT EXISTS topics (topic TEXT, article TEXT, language TEXT, PRIMARY KEY (topic, article, language))",
+]
+
+def open_warehouse(path : str = WAREHOUSE_PATH) -> sqlite3.Connection:
+
+    """Opens the warehouse, creating tables and indexes on first use"""
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+
+    for statement in WAREHOUSE_SCHEMA:
+        connection.execute(statement)
+
+    # warehouses created before parentid was stored
+    if 'parentid' not in [row[1] for row in connection.execute("PRAGMA table_info(edits)")]:
+        connection.execute("ALTER TABLE edits ADD COLUMN parentid INTEGER")
+
+    return connection
+
+def to_sql_rows(df : pd.DataFrame, columns : list) -> list:
+
+    """Returns rows of a table as tuples of python values, timestamps as sortable text and missing values as None"""
+
+    df = df[columns].copy()
+
+    for c in ['timestamp', 'expiry']:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors='coerce').dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    for c in ['type', 'level']:
+        if c in df.columns:
+            df[c] = df[c].map(lambda v: json.dumps(parse_list(v)))
+
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+def upsert(connection : sqlite3.Connection, table : str, columns : list, key : list, rows : list):
+
+    """Inserts rows, rows whose key is already stored are updated"""
+
+    connection.executemany(
+        "INSERT INTO {t} ({c}) VALUES ({q}) ON CONFLICT ({k}) DO UPDATE SET {u}".format(
+            t = table,
+            c = ", ".join(columns),
+            q = ", ".join("?" * len(columns)),
+            k = ", ".join(key),
+            u = ", ".join("{c} = excluded.{c}".format(c = c) for c in columns if c not in key),
+        ),
+        rows,
+    )
+
+def upsert_edits(df : pd.DataFrame, topic : str, path : str = WAREHOUSE_PATH):
+
+    """
+    Stores detailed edits by language and revision id, revisions stored by earlier runs are updated instead of duplicated.
+    article_edits is recounted only for the users of the article-languages in df, so the cost grows with df and not with the stored history.
+    """
+
+    if 'revid' not in df.columns:
+        raise ValueError("The warehouse is keyed by revision id, the edits table has no revid column")
+
+    with closing(open_warehouse(path)) as connection, connection:
+
+        upsert(connection, "edits", WAREHOUSE_EDITS_COLUMNS, ['language', 'revid'], to_sql_rows(df, WAREHOUSE_EDITS_COLUMNS))
+
+        pairs = df[['article', 'language']].drop_duplicates()
+        connection.executemany("INSERT OR IGNORE INTO topics VALUES (?, ?, ?)", [(topic, a, l) for a, l in pairs.itertuples(index=False)])
+
+        # users of df are counted in one grouped pass over their edits instead of one statement per user
+        triples = df[['article', 'language', 'user']].drop_duplicates().dropna()
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS touched_users (article TEXT, language TEXT, user TEXT)")
+        connection.execute("DELETE FROM touched_users")
+        connection.executemany("INSERT INTO touched_users VALUES (?, ?, ?)", list(triples.astype(object).itertuples(index=False, name=None)))
+        connection.execute(
+            """UPDATE edits SET article_edits = c.n FROM (
+                SELECT e.article, e.language, e.user, COUNT(*) AS n
+                FROM touched_users t JOIN edits e ON e.article = t.article AND e.language = t.language AND e.user = t.user
+                GROUP BY e.article, e.language, e.user
+            ) AS c WHERE edits.article = c.article AND edits.language = c.language AND edits.user = c.user"""
+        )
+
+def upsert_protections(df : pd.DataFrame, topic : str, path : str = WAREHOUSE_PATH):
+
+    """Stores protection logs, logs stored earlier for the same article-languages are replaced"""
+
+    if len(df) == 0:
+        return
+
+    with closing(open_warehouse(path)) as connection, connection:
+
+        pairs = df[['article', 'language']].drop_duplicates()
+        connection.executemany("DELETE FROM protections WHERE article = ? AND language = ?", list(pairs.itertuples(index=False, name=None)))
+        connection.executemany(
+            "INSERT INTO protections VALUES ({q})".format(q = ", ".join("?" * len(WAREHOUSE_PROTECTIONS_COLUMNS))),
+            to_sql_rows(df, WAREHOUSE_PROTECTIONS_COLUMNS),
+        )
+
+        connection.executemany("INSERT OR IGNORE INTO topics VALUES (?, ?, ?)", [(topic, a, l) for a, l in pairs.itertuples(index=False)])
+
+def query_warehouse(table : str, topics : list = None, langs : list = None, start : datetime = None, end : datetime = None, path : str = WAREHOUSE_PATH) -> pd.DataFrame:
+
+    """Returns rows of a warehouse table with their topic, filtered by topics, languages and a timestamp range"""
+
+    conditions, params = [], []
+
+    if topics is not None:
+        conditions.append("t.topic IN ({q})".format(q = ", ".join("?" * len(topics))))
+        params += list(topics)
+    if langs is not None:
+        conditions.append("x.language IN ({q})".format(q = ", ".join("?" * len(langs))))
+        params += list(langs)
+    if start is not None:
+        conditions.append("x.timestamp >= ?")
+        params.append(pd.Timestamp(start).strftime("%Y-%m-%d %H:%M:%S"))
+    if end is not None:
+        conditions.append("x.timestamp <= ?")
+        params.append(pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S"))
+
+    query = "SELECT t.topic, x.* FROM {table} x JOIN topics t ON t.article = x.article AND t.language = x.language".format(table = table)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    with closing(open_warehouse(path)) as connection:
+        df = pd.read_sql_query(query, connection, params=params)
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+
+    return df
+
+def load_warehouse_edits(topics : list = None, langs : list = None, start : datetime = None, end : datetime = None, path : str = WAREHOUSE_PATH) -> pd.DataFrame:
+
+    """Loads detailed edits from the warehouse, i.e. load_warehouse_edits(['Ukraine'], ['en'], start=datetime(2010,1,1))"""
+
+    return query_warehouse("edits", topics, langs, start, end, path)
+
+def load_warehouse_protections(topics : list = None, langs : list = None, start : datetime = None, end : datetime = None, path : str = WAREHOUSE_PATH) -> pd.DataFrame:
+
+    df = query_warehouse("protections", topics, langs, start, end, path)
+    df['expiry'] = pd.to_datetime(df['expiry'])
+    df['type'] = df['type'].map(json.loads)
+    df['level'] = df['level'].map(json.loads)
+
+    return df
+
+def load_warehouse_watermarks(topic : str, path : str = WAREHOUSE_PATH) -> dict:
+
+    """Returns {lang: {article: watermark}} of the newest stored revision of every article-language of a topic, None if there is none"""
+
+    with closing(open_warehouse(path)) as connection:
+        rows = connection.execute(
+            """SELECT e.language, e.article, MAX(e.revid), MAX(e.timestamp) FROM edits e
+            JOIN topics t ON t.article = e.article AND t.language = e.language
+            WHERE t.topic = ? GROUP BY e.language, e.article""",
+            (topic,),
+        ).fetchall()
+
+    if len(rows) == 0:
+        return None
+
+    watermarks = {}
+    for l, a, revid, ts in rows:
+        watermarks.setdefault(l, {})[a] = {'revid': revid, 'timestamp': ts.replace(" ", "T") + "Z"}
+
+    return watermarks
+
+## Compact in-memory edit tables used by the analyses
+
+# columns of the detailed edits table kept in memory
+EDIT_COLUMNS = ['revid', 'parentid', 'user', 'timestamp', 'size', 'reverted', 'reversion', 'topic', 'article', 'language', 'total_edits', 'article_edits']
+
+# repeated string keys are stored once per table as categories
+CATEGORY_COLS = ['user', 'topic', 'article', 'language']
+
+# revid, parentid, total_edits and article_edits stay nullable, rows of tables written before revids were kept have no revid
+# and users whose counts were not available (i.e. hidden users) are NA and not 0
+COMPACT_DTYPES = {
+    'revid': 'Int64',
+    'parentid': 'Int64',
+    'size': 'int32',
+    'reverted': 'int8',
+    'reversion': 'int8',
+    'article_edits': 'Int32',
+    'total_edits': 'Int32',
+}
+
+# derived time fields computed on demand by time_field()
+TIME_FIELD_DTYPES = {
+    'year': 'int16',
+    'month': 'int8',
+    'day': 'int8',
+    'hour': 'int8',
+    'dayofweek': 'int8',
+}
+
+def compact_edits(df : pd.DataFrame) -> pd.DataFrame:
+
+    """Casts a detailed edits table to categorical keys, narrow integers and second resolution timestamps"""
+
+    df = df[[c for c in EDIT_COLUMNS if c in df.columns]]
+    df = df.astype({c: t for c, t in COMPACT_DTYPES.items() if c in df.columns})
+    df = df.astype({c: 'category' for c in CATEGORY_COLS if c in df.columns})
+
+    return df.assign(timestamp=pd.to_datetime(df['timestamp']).astype('datetime64[s]'))
+
+def concat_edit_tables(frames : list) -> pd.DataFrame:
+
+    """Concatenates compact edit tables, categories are unified first so the keys stay categorical"""
+
+    frames = list(frames)
+
+    for c in CATEGORY_COLS:
+        if all(c in df.columns for df in frames):
+            categories = pd.api.types.union_categoricals([df[c] for df in frames], sort_categories=True).categories
+            frames = [df.assign(**{c: df[c].cat.set_categories(categories)}) for df in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+def load_edit_tables(sources : dict = None, topics : list = None, drop_duplicates : bool = True, storage : str = "parquet") -> pd.DataFrame:
+
+    """
+    Loads detailed edits of several topics into one compact table, i.e. load_edit_tables({'Ukraine': "detailedEdits_Ukraine.csv"}).
+    sources maps topics to csv files written by ETL(), without sources the topics are read from storage ("parquet" or "sqlite").
+    Edits read from the warehouse are unique already and need no drop_duplicates.
+    Month, year and ratio of edits are not stored, use time_field() and ratio_edits() where they are needed.
+    Duplicates are found by topic, language and revid, tables written before revids were kept are compared row by row.
+    """
+
+    if sources is None and storage == "sqlite":
+        df = compact_edits(load_warehouse_edits(topics))
+    elif sources is None:
+        # datasets written before revids were kept have no revid and parentid
+        df = compact_edits(load_edits(topics, [c for c in EDIT_COLUMNS if c in dataset_columns(EDITS_DATASET)]))
+    else:
+        frames = []
+        for topic, path in sources.items():
+            # string keys are parsed straight into categories, numbers are cast right after parsing
+            df = pd.read_csv(path, usecols=lambda c: c in EDIT_COLUMNS, dtype={c: 'category' for c in CATEGORY_COLS})
+            frames.append(compact_edits(df.assign(topic=pd.Categorical([topic] * len(df)))))
+        df = concat_edit_tables(frames)
+
+    # an article-language can belong to several topics and keeps its edits in each of them
+    if drop_duplicates and 'revid' in df.columns:
+        # rows of tables written before revids were kept have no revid and are compared as whole rows
+        duplicated = np.where(df['revid'].notna(), df.duplicated(['topic', 'language', 'revid']), df.duplicated())
+        df = df[~duplicated].reset_index(drop=True)
+    elif drop_duplicates:
+        df = df.drop_duplicates(ignore_index=True)
+
+    return df
+
+def time_field(df : pd.DataFrame, field : str) -> pd.Series:
+
+    """Returns year, month, day, hour or dayofweek of each edit as a narrow integer series named after the field"""
+
+    return getattr(df['timestamp'].dt, field).astype(TIME_FIELD_DTYPES[field]).rename(field)
+
+def ratio_edits(df : pd.DataFrame) -> pd.Series:
+
+    """Returns article_edits / total_edits, 1.01 where total_edits is 0 (mostly anonymous users without totals)"""
+
+    ratio = df['article_edits'] / df['total_edits']
+
+    return ratio.astype('float32').replace(np.inf, 1.01).rename('ratio_edits')
+
+def size_deltas(df : pd.DataFrame) -> pd.Series:
+
+    """
+    Returns the change of article size made by each edit, size minus the size of its parent revision.
+    Parents are looked up by language and revid, so the table needs no sorting. Edits creating a page
+    have the whole size as delta, edits whose parent is not in df get NaN.
+    """
+
+    parents = pd.Series(df['size'].to_numpy(), index=pd.MultiIndex.from_arrays([df['language'].astype(str), df['revid']]))
+    # rows without revid (tables written before revids were kept) cannot be parents
+    parents = parents[~parents.index.duplicated() & df['revid'].notna().to_numpy()]
+
+    parent_size = parents.reindex(pd.MultiIndex.from_arrays([df['language'].astype(str), df['parentid']])).to_numpy(dtype=float)
+    parent_size[df['parentid'].to_numpy() == 0] = 0
+
+    return pd.Series(df['size'].to_numpy() - parent_size, index=df.index, name='size_delta')
+
+## Memory-mapped timelines of every article-language
+
+TIMELINE_DIR = "data/timelines"
+
+# parallel arrays of a timeline store, one value per edit, stored as .npy files
+TIMELINE_ARRAYS = {
+    'timestamp': 'int64', # seconds since 1970-01-01
+    'size': 'int32',
+    'reverted': 'int8',
+    'reversion': 'int8',
+}
+
+def write_timelines(df : pd.DataFrame, path : str = TIMELINE_DIR) -> str:
+
+    """
+    Writes the edits of every article-language as one contiguous, time sorted run of each array in TIMELINE_ARRAYS.
+    index.csv holds article, language, topic and the [start, stop) offsets of every series.
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    df = df.sort_values(['article', 'language', 'timestamp'], kind='stable')
+
+    arrays = {
+        'timestamp': df['timestamp'].to_numpy(dtype='datetime64[s]').astype(np.int64),
+        'size': df['size'].to_numpy(),
+        'reverted': df['reverted'].to_numpy(),
+        'reversion': df['reversion'].to_numpy(),
+    }
+
+    for name, dtype in TIMELINE_ARRAYS.items():
+        np.save(os.path.join(path, name + ".npy"), arrays[name].astype(dtype))
+
+    keys = df[['article', 'language']].astype(str)
+    starts = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).to_numpy())
+
+    index = keys.iloc[starts].reset_index(drop=True)
+    index['topic'] = df['topic'].astype(str).to_numpy()[starts] if 'topic' in df.columns else ""
+    index['start'] = starts
+    index['stop'] = np.append(starts[1:], len(df))
+
+    index.to_csv(os.path.join(path, "index.csv"), index=False)
+
+    return path
+
+class TimelineStore:
+
+    """
+    Timelines written by write_timelines(), opened as read-only memory maps so only the parts used are read from disk.
+    store.series('Kyiv', 'en') returns {'timestamp': ..., 'size': ..., ...} as views without copying.
+    """
+
+    def __init__(self, path : str = TIMELINE_DIR):
+        self.path = path
+        self.arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode='r') for name in TIMELINE_ARRAYS}
+        self.index = pd.read_csv(os.path.join(path, "index.csv"), keep_default_na=False)
+        self.offsets = {
+            (a, l): (start, stop)
+            for a, l, start, stop in self.index[['article', 'language', 'start', 'stop']].itertuples(index=False)
+        }
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def keys(self) -> list:
+
+        """Returns (article, language) of all series"""
+
+        return list(self.offsets)
+
+    def series(self, article : str, lang : str, columns : list = None) -> dict:
+
+        """Returns the arrays of one article-language, empty arrays if it is not stored"""
+
+        start, stop = self.offsets.get((article, lang), (0, 0))
+
+        return {name: self.arrays[name][start:stop] for name in (columns or TIMELINE_ARRAYS)}
+
+    def timestamps(self, article : str, lang : str) -> np.ndarray:
+
+        """Returns the sorted edit times of one article-language as datetime64[s]"""
+
+        return self.series(article, lang, ['timestamp'])['timestamp'].view('datetime64[s]')
+
+def open_timelines(path : str = TIMELINE_DIR) -> TimelineStore:
+
+    return TimelineStore(path)
@@ -0,0 +1,122 @@
+## Here the asynchronous revision fetcher is tested against a local stub of the MediaWiki action API, run with python -m pytest code
+import json
+import threading
+import time as tm
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import http_functions
+import api_functions
+
+# number of revisions of each stub article, "Broken" answers with HTTP 500
+STUB_REVISIONS = {"Long": 1234, "Short": 3, "Empty": 0}
+
+class StubAPI(BaseHTTPRequestHandler):
+
+    """Serves prop=revisions queries page by page with rvcontinue tokens and counts requests in flight"""
+
+    stats = {'in_flight': 0, 'max_in_flight': 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+
+        with self.lock:
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+        try:
+            tm.sleep(0.05)
+            params = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            title = params["titles"]
+
+            if title == "Broken":
+                self.send_response(500)
+                self.end_headers()
+                return
+
+            n = STUB_REVISIONS.get(title, 10)
+            revisions = [{"revid": i, "parentid": i - 1, "user": "U", "timestamp": "2020-01-01T00:00:00Z", "size": i} for i in range(n, 0, -1)]
+
+            start, limit = int(params.get("rvcontinue", 0)), int(params["rvlimit"])
+            body = {"query": {"pages": {"1": {"title": title, "revisions": revisions[start:start + limit]}}}}
+            if start + limit < n:
+                body["continue"] = {"rvcontinue": str(start + limit), "continue": "||"}
+
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(data)
+
+        finally:
+            with self.lock:
+                self.stats['in_flight'] -= 1
+
+@pytest.fixture
+def stub_api(monkeypatch, tmp_path):
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = "http://127.0.0.1:{port}/{{lang}}/api.php".format(port=server.server_address[1])
+    monkeypatch.setattr(http_functions, "API_URL", url)
+    monkeypatch.setattr(http_functions, "HOST_CONCURRENCY", 2)
+    monkeypatch.setattr(http_functions, "BURST", 100)
+    monkeypatch.setattr(http_functions, "cache", None)
+    monkeypatch.chdir(tmp_path)
+
+    # the token bucket does not slow the test down, concurrency is bounded by the host semaphore only
+    monkeypatch.setitem(http_functions.buckets, http_functions.get_host(url), http_functions.TokenBucket(rate=1000.0))
+    StubAPI.stats.update(in_flight=0, max_in_flight=0)
+
+    yield StubAPI.stats
+
+    server.shutdown()
+    server.server_close()
+
+def test_continuation_is_followed(stub_api):
+
+    revisions, failed = api_functions.get_multiple_revisions(["Long", "Short", "Empty"], ["en"])
+
+    assert failed == []
+    assert [r['revid'] for r in revisions["en"]["Long"]] == list(range(1234, 0, -1))
+    assert len(revisions["en"]["Short"]) == 3
+    assert revisions["en"]["Empty"] == []
+
+def test_requests_per_host_are_bounded(stub_api):
+
+    articles = ["Article{i}".format(i=i) for i in range(12)]
+
+    revisions, failed = api_functions.get_multiple_revisions(articles, ["en"])
+
+    assert failed == []
+    assert all(len(revisions["en"][a]) == 10 for a in articles)
+    assert stub_api['max_in_flight'] == http_functions.HOST_CONCURRENCY
+
+def test_failures_are_reported(stub_api):
+
+    written, discarded = {}, []
+
+    class Writer:
+
+        def __init__(self, l, a):
+            self.key, self.pages = (l, a), []
+
+        def write(self, page):
+            self.pages.append(page)
+
+        def close(self):
+            written[self.key] = sum(self.pages, [])
+
+        def discard(self):
+            discarded.append(self.key)
+
+    revisions, failed = api_functions.get_multiple_revisions(["Short", "Broken"], ["en"], open_writer=Writer)
+
+    assert failed == [("en", "Broken")]
+    assert discarded == [("en", "Broken")]
+    assert len(written[("en", "Short")]) == 3
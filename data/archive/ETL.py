@@ -130,7 +130,7 @@ def append_table(filepath: str, table2: pd.DataFrame):
         print("IDK what happened")
         return
 
-    concat_table.drop_duplicates()
+    concat_table = concat_table.drop_duplicates()
 
     duplicates = concat_table.duplicated(
         subset=["Article", "Language", "Month"], keep=False
@@ -193,7 +193,7 @@ def write_protection_status(articles: list, langs: list):
     table1 = get_protection_status(articles, langs)
     table2 = pd.read_csv(filepath)
     concat_table = pd.concat([table1, table2], axis=0)
-    concat_table.drop_duplicates()
+    concat_table = concat_table.drop_duplicates()
 
     concat_table.to_csv(filepath, index=False)
     print("success!")
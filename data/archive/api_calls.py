@@ -369,29 +369,26 @@ def get_protection(article: str, lang: str = "en") -> list:
 
 def get_user_edits(user: str, lang: str, prev: str = None):
 
-    uccontinue = ""
+    contribs = []
 
-    if prev is not None:
-        uccontinue += "uccontinue={prev}&".format(prev=prev)
+    while True:
 
-    query = "https://{lang}.wikipedia.org/w/api.php?action=query&list=usercontribs&ucuser={user}&uclimit=500&{uccontinue}format=json".format(
-        lang=lang, user=user, uccontinue=uccontinue
-    )
+        uccontinue = ""
 
-    response = req.get(query).json()
-    contribs = response["query"]["usercontribs"]
+        if prev is not None:
+            uccontinue += "uccontinue={prev}&".format(prev=prev)
 
-    try:
-        prev = response["continue"]["uccontinue"]
-    except:
-        prev = ""
-    
-    if prev == "":
-        return contribs
-    
-    else:
-        contribs.extend(get_user_edits(user, lang, prev))
-        return contribs
+        query = "https://{lang}.wikipedia.org/w/api.php?action=query&list=usercontribs&ucuser={user}&uclimit=500&{uccontinue}format=json".format(
+            lang=lang, user=user, uccontinue=uccontinue
+        )
+
+        response = req.get(query).json()
+        contribs.extend(response["query"]["usercontribs"])
+
+        prev = response.get("continue", {}).get("uccontinue")
+
+        if prev is None:
+            return contribs
 
 
 if __name__ == "__main__":